@@ -3,88 +3,315 @@ tf.get_logger().setLevel('ERROR')
 from tensorflow.keras.applications import MobileNetV2
 from tensorflow.keras.applications.mobilenet_v2 import preprocess_input, decode_predictions
 from tensorflow.keras.preprocessing import image
+from PIL import Image
 import numpy as np
-import matplotlib.pyplot as plt
+import argparse
+import atexit
+import csv
+import glob
+import json
 import os
+import time
+from gradcam import benchmark as benchmark_gradcam, get_gradcam
+from image_io import overlay_heatmap, save_image
+from tensor_cache import TensorCache
+from tflite_backend import compare_backends, load_backend, print_comparison
 
 # --- Grad-CAM helpers ---
-def get_last_conv_layer(model):
-    preferred = ["Conv_1", "out_relu"]
-    by_name = {layer.name: layer for layer in model.layers}
-    for name in preferred:
-        if name in by_name:
-            return by_name[name]
-    for layer in reversed(model.layers):
-        try:
-            out_shape = layer.output_shape
-        except Exception:
-            continue
-        if isinstance(out_shape, tuple) and len(out_shape) == 4:
-            return layer
-    raise ValueError("No suitable conv layer found for Grad-CAM.")
-
 def make_gradcam_heatmap(img_array_batched, model, conv_layer_name=None, class_index=None):
-    conv_layer = (model.get_layer(conv_layer_name) if conv_layer_name
-                  else get_last_conv_layer(model))
-    grad_model = tf.keras.models.Model([model.inputs],
-                                       [conv_layer.output, model.output])
-    with tf.GradientTape() as tape:
-        conv_outputs, preds = grad_model(img_array_batched)
-        if class_index is None:
-            class_index = tf.argmax(preds[0])
-        class_channel = preds[:, class_index]
-    grads = tape.gradient(class_channel, conv_outputs)
-    pooled_grads = tf.reduce_mean(grads, axis=(0, 1, 2))
-    conv_outputs = conv_outputs[0]
-    heatmap = tf.reduce_sum(tf.multiply(conv_outputs, pooled_grads), axis=-1)
-    heatmap = tf.maximum(heatmap, 0)
-    heatmap = heatmap / (tf.reduce_max(heatmap) + 1e-8)
-    return heatmap.numpy().astype("float32")
-
-def overlay_heatmap_on_image(orig_img_path, heatmap, output_path, alpha=0.4):
-    orig = image.load_img(orig_img_path)
-    orig_arr = image.img_to_array(orig).astype("uint8")
-    h, w = orig_arr.shape[:2]
-    heatmap_resized = tf.image.resize(heatmap[..., None], (h, w)).numpy().squeeze()
-    plt.figure(figsize=(6, 6))
-    plt.imshow(orig_arr)
-    plt.imshow(heatmap_resized, cmap="jet", alpha=alpha)
-    plt.axis("off")
-    plt.savefig(output_path, bbox_inches="tight", pad_inches=0)
-    plt.close()
+    _, heatmaps = get_gradcam(model, conv_layer_name)(img_array_batched, class_index)
+    return heatmaps[0]
+
+def overlay_heatmap_on_image(orig_img_path, heatmap, output_path, alpha=0.4, pixels=None):
+    # Reuse the caller's decoded pixels when it has them
+    orig_arr = pixels if pixels is not None else load_rgb(orig_img_path)
+    # Colorize and blend in NumPy, then encode the pixels directly
+    save_image(overlay_heatmap(orig_arr, heatmap, alpha=alpha), output_path)
 
 
 model = MobileNetV2(weights="imagenet")
 
+# --- Decoding and the preprocessed tensor cache ---
+use_tensor_cache = True
+tensor_cache_dir = "tensor_cache"
+tensor_cache_max_mb = 1024
+_tensor_cache = None
+
+def get_tensor_cache():
+    """The shared TensorCache, opened on first use; None when use_tensor_cache is off."""
+    global _tensor_cache
+    if not use_tensor_cache:
+        return None
+    if _tensor_cache is None:
+        _tensor_cache = TensorCache(tensor_cache_dir, shape=(224, 224, 3), max_mb=tensor_cache_max_mb)
+        # The index is written once at exit, not after every image
+        atexit.register(_tensor_cache.save)
+    return _tensor_cache
+
+def load_rgb(image_path):
+    """Decode an image at full size into a uint8 RGB array, as load_img() does."""
+    return np.asarray(image.load_img(image_path))
+
+def prepare(pixels, size=(224, 224)):
+    """Model input from decoded pixels, identical to load_img(target_size=size) + preprocess_input."""
+    resized = Image.fromarray(pixels).resize(size, Image.NEAREST)
+    return preprocess_input(np.asarray(resized, dtype=np.float32))
+
+# --- Prediction backend ---
+BACKENDS = ("keras", "tflite-dynamic", "tflite-int8")
+predictor = model  # anything with predict_on_batch(); see set_backend()
+
+def set_backend(name, calibration_dir=None):
+    """Predict with the Keras model or a quantized TFLite copy of it (converted once, then cached)."""
+    global predictor
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend '{name}'. Choose from: {', '.join(BACKENDS)}")
+    if name == "keras":
+        predictor = model
+        return
+    calibration_paths = list_images(calibration_dir) if calibration_dir else []
+    predictor = load_backend(model, name.split("-", 1)[1], calibration_paths)
+
 def classify_image(image_path):
     try:
-        img = image.load_img(image_path, target_size=(224, 224))
-        img_array = image.img_to_array(img)
-        img_array = preprocess_input(img_array)
+        # Decode at most once: the pixels feed the model input on a cache
+        # miss and the Grad-CAM overlay
+        pixels = None
+
+        def decode_and_prepare(path):
+            nonlocal pixels
+            pixels = load_rgb(path)
+            return prepare(pixels)
+
+        cache = get_tensor_cache()
+        if cache is not None:
+            img_array = cache.load(image_path, decode_and_prepare, "mobilenet_v2/nearest")
+        else:
+            img_array = decode_and_prepare(image_path)
         img_array = np.expand_dims(img_array, axis=0)
 
-        predictions = model.predict(img_array)
-        predictions = model.predict(img_array, verbose=0)
+        if predictor is model:
+            # One forward pass gives both the predictions and the top-1 Grad-CAM heatmap
+            predictions, heatmaps = get_gradcam(model)(img_array)
+        else:
+            predictions, heatmaps = predictor.predict_on_batch(img_array), None
         decoded_predictions = decode_predictions(predictions, top=3)[0]
 
         print("\nTop-3 Predictions for", image_path)
         for i, (_, label, score) in enumerate(decoded_predictions):
             print(f"  {i + 1}: {label} ({score:.2f})")
+        if heatmaps is None:
+            # Grad-CAM needs gradients, which only the Keras model provides
+            print("Grad-CAM skipped: it needs the Keras backend.")
+            return
             
 # --- Grad-CAM for top-1 class ---
-        top1_class_index = int(np.argmax(predictions[0]))
-        heatmap = make_gradcam_heatmap(
-            img_array, model, conv_layer_name=None, class_index=top1_class_index
-        )
+        heatmap = heatmaps[0]
         base, _ = os.path.splitext(image_path)
         gradcam_path = f"{base}_gradcam.png"
-        overlay_heatmap_on_image(image_path, heatmap, gradcam_path, alpha=0.4)
+        overlay_heatmap_on_image(image_path, heatmap, gradcam_path, alpha=0.4, pixels=pixels)
         print(f"Grad-CAM saved to: {gradcam_path}")
         
     except Exception as e:
         print(f"Error processing '{image_path}': {e}")
 
+# --- Batch classification ---
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".gif")
+
+def list_images(pattern):
+    """Return the image files in a directory, or those matching a glob pattern, sorted."""
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, "*")
+    return sorted(p for p in glob.glob(pattern)
+                  if os.path.isfile(p) and p.lower().endswith(IMAGE_EXTENSIONS))
+
+def load_and_preprocess(path, size=(224, 224)):
+    """Decode, resize and preprocess one image file inside a tf.data pipeline."""
+    data = tf.io.read_file(path)
+    img = tf.image.decode_image(data, channels=3, expand_animations=False)
+    # Nearest-neighbour, like prepare() and load_img(), so batch and
+    # interactive results agree
+    img = tf.image.resize(tf.cast(img, tf.float32), size, method="nearest")
+    return path, preprocess_input(img)
+
+def make_dataset(paths, batch_size=32):
+    """
+    Build a tf.data pipeline that decodes and resizes images in parallel.
+
+    Files that cannot be decoded are skipped; each element carries its
+    path so results stay matched to their files.
+    """
+    dataset = tf.data.Dataset.from_tensor_slices(paths)
+    dataset = dataset.map(load_and_preprocess, num_parallel_calls=tf.data.AUTOTUNE)
+    dataset = dataset.ignore_errors()
+    return dataset.batch(batch_size).prefetch(tf.data.AUTOTUNE)
+
+def load_batches(paths, batch_size=32):
+    """
+    Yield (paths, images) batches of preprocessed images, in order.
+
+    With the tensor cache on, cached images are read from it and the misses
+    all go through one make_dataset() pipeline, so decoding still runs in
+    parallel and ahead of the consumer. The cache index is saved when the
+    generator finishes or is closed early. Files that cannot be decoded are
+    skipped either way.
+    """
+    cache = get_tensor_cache()
+    if cache is None:
+        for batch_paths, batch_images in make_dataset(paths, batch_size):
+            yield [p.decode("utf-8") for p in batch_paths.numpy()], batch_images
+        return
+
+    def decoded(missing):
+        for batch_paths, batch_images in make_dataset(missing, batch_size):
+            for path, tensor in zip(batch_paths.numpy(), batch_images.numpy()):
+                yield path.decode("utf-8"), tensor
+
+    try:
+        # Decoded by TensorFlow rather than PIL, so kept apart from classify_image()'s entries
+        keys = {p: cache.key(p, "mobilenet_v2/tf-nearest") for p in paths}
+        tensors = {p: cache.get(keys[p]) for p in keys}
+        missing = [p for p in keys if tensors[p] is None]
+        # The pipeline returns the misses in order, minus any it could not decode
+        stream = decoded(missing) if missing else iter(())
+        head = next(stream, None)
+        ready, images = [], []
+        for path in paths:
+            if tensors[path] is None:
+                if head is None or head[0] != path:
+                    continue
+                cache.put(keys[path], head[1])
+                tensors[path] = head[1]
+                head = next(stream, None)
+            ready.append(path)
+            images.append(tensors[path])
+            if len(ready) == batch_size:
+                yield ready, np.stack(images)
+                ready, images = [], []
+        if ready:
+            yield ready, np.stack(images)
+    finally:
+        cache.save()
+
+def classify_batch(paths, batch_size=32, top_k=3):
+    """
+    Classify many images, running one predict call per batch.
+
+    Args:
+        paths (List[str]): Image files.
+        batch_size (int): Images per predict call.
+        top_k (int): Predictions kept per image.
+
+    Returns:
+        Tuple[List[dict], float]: One result per decoded image ("path" and
+        "predictions", a list of "class_id", "label" and "score"), and the
+        elapsed seconds.
+    """
+    results = []
+    start = time.perf_counter()
+    for batch_paths, batch_images in load_batches(paths, batch_size):
+        predictions = predictor.predict_on_batch(batch_images)
+        for path, decoded in zip(batch_paths, decode_predictions(predictions, top=top_k)):
+            results.append({
+                "path": path,
+                "predictions": [{"class_id": class_id, "label": label, "score": float(score)}
+                                for class_id, label, score in decoded],
+            })
+    return results, time.perf_counter() - start
+
+def write_results(results, output_path):
+    """Write classify_batch() results as JSON Lines (.jsonl) or CSV (anything else)."""
+    with open(output_path, "w", newline="", encoding="utf-8") as f:
+        if output_path.lower().endswith(".jsonl"):
+            for result in results:
+                f.write(json.dumps(result) + "\n")
+            return
+        writer = csv.writer(f)
+        writer.writerow(["path", "rank", "class_id", "label", "score"])
+        for result in results:
+            for rank, p in enumerate(result["predictions"], start=1):
+                writer.writerow([result["path"], rank, p["class_id"], p["label"],
+                                 f"{p['score']:.6f}"])
+
+def run_batch(pattern, output_path, batch_size=32, top_k=3):
+    """Classify every image matching pattern, save the results and report images/sec."""
+    paths = list_images(pattern)
+    if not paths:
+        print(f"No images found for '{pattern}'.")
+        return
+    results, elapsed = classify_batch(paths, batch_size, top_k)
+    write_results(results, output_path)
+    skipped = len(paths) - len(results)
+    print(f"Classified {len(results)} images in {elapsed:.2f}s "
+          f"({len(results) / elapsed:.1f} images/sec); results saved to {output_path}"
+          + (f"; {skipped} could not be decoded" if skipped else ""))
+    cache = get_tensor_cache()
+    if cache is not None:
+        stats = cache.stats()
+        print(f"Tensor cache: {stats['hits']} hits, {stats['misses']} misses, "
+              f"{stats['entries']} entries ({stats['size_mb']:.0f} MB) in '{cache.directory}'")
+
+def run_gradcam_benchmark(pattern, batch_size=32, top_k=3):
+    """Time batched Grad-CAM against the per-image loop on up to batch_size images."""
+    paths = list_images(pattern)
+    if not paths:
+        print(f"No images found for '{pattern}'.")
+        return
+    batches = load_batches(paths, batch_size)
+    _, images = next(batches)
+    batches.close()  # saves the tensor cache
+    result = benchmark_gradcam(model, np.asarray(images), top_k=top_k)
+    print(f"Grad-CAM for the top-{top_k} classes of {result['images']} images: "
+          f"per-image loop {result['loop']:.2f}s, batched {result['batched']:.2f}s "
+          f"({result['speedup']:.1f}x faster, max heatmap difference {result['max_abs_diff']:.1e})")
+    print(json.dumps(result))
+
+def run_backend_comparison(pattern, calibration_dir=None, batch_size=32):
+    """Report top-1 agreement and images/sec of the quantized backends against Keras."""
+    paths = list_images(pattern)
+    if not paths:
+        print(f"No images found for '{pattern}'.")
+        return
+    images = np.concatenate([np.asarray(batch) for _, batch in load_batches(paths, batch_size)])
+    backends = {"tflite-dynamic": load_backend(model, "dynamic")}
+    if calibration_dir:
+        backends["tflite-int8"] = load_backend(model, "int8", list_images(calibration_dir))
+    else:
+        print("No --calibration-dir given; skipping the int8 backend.")
+    print_comparison(compare_backends(model, backends, images, batch_size), len(images))
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Classify images with MobileNetV2.")
+    parser.add_argument("--batch", metavar="DIR_OR_GLOB",
+                        help="classify every image in a directory or matching a glob")
+    parser.add_argument("--benchmark-gradcam", metavar="DIR_OR_GLOB",
+                        help="compare batched and per-image Grad-CAM on these images")
+    parser.add_argument("--output", default="predictions.csv",
+                        help="results file for --batch (.csv or .jsonl)")
+    parser.add_argument("--backend", choices=BACKENDS, default="keras",
+                        help="prediction backend; TFLite models are converted once and cached")
+    parser.add_argument("--calibration-dir",
+                        help="sample images for calibrating tflite-int8 quantization")
+    parser.add_argument("--compare-backends", metavar="DIR_OR_GLOB",
+                        help="report accuracy and speed of the TFLite backends against Keras")
+    parser.add_argument("--no-tensor-cache", action="store_true",
+                        help="always decode and preprocess images instead of using the cache")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--top-k", type=int, default=3)
+    args = parser.parse_args()
+    use_tensor_cache = not args.no_tensor_cache
+
+    if args.compare_backends:
+        run_backend_comparison(args.compare_backends, args.calibration_dir, args.batch_size)
+        raise SystemExit(0)
+    set_backend(args.backend, args.calibration_dir)
+    if args.batch:
+        run_batch(args.batch, args.output, args.batch_size, args.top_k)
+        raise SystemExit(0)
+    if args.benchmark_gradcam:
+        run_gradcam_benchmark(args.benchmark_gradcam, args.batch_size, args.top_k)
+        raise SystemExit(0)
+
     print("Image Classifier (type 'exit' to quit)\n")
     while True:
         image_path = input("Enter image filename: ").strip()
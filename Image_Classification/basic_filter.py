@@ -1,23 +1,61 @@
 from PIL import Image, ImageFilter
-import matplotlib.pyplot as plt
+from batch_filter import CHECKS, print_batch_report, run_batch, stage
+from image_io import save_image
+from functools import partial
+import argparse
 import os
 
+def blur(img):
+    return img.resize((128, 128)).filter(ImageFilter.GaussianBlur(radius=2))
+
 def apply_blur_filter(image_path, output_path="blurred_image.png"):
     try:
         img = Image.open(image_path)
-        img_resized = img.resize((128, 128))
-        img_blurred = img_resized.filter(ImageFilter.GaussianBlur(radius=2))
+        img_blurred = blur(img)
 
-        plt.imshow(img_blurred)
-        plt.axis('off')
-        plt.savefig(output_path, bbox_inches='tight', pad_inches=0)
-        plt.close()
+        save_image(img_blurred, output_path)
         print(f"Processed image saved as '{output_path}'.")
 
     except Exception as e:
         print(f"Error processing image: {e}")
 
+# --------- Batch mode ---------
+# filter name -> (function, output suffix)
+BATCH_FILTERS = {"blur": (blur, "blurred")}
+
+def batch_job(source, outputs, timings, filters):
+    """Batch job for run_batch(): decode once, then filter and encode each output."""
+    with stage(timings, "decode"):
+        img = Image.open(source)
+        img.load()
+    for name in filters:
+        fn, suffix = BATCH_FILTERS[name]
+        with stage(timings, "filter"):
+            result = fn(img)
+        with stage(timings, "encode"):
+            save_image(result, outputs[suffix])
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Blur images, interactively or a directory at a time.")
+    parser.add_argument("--input-dir", help="filter every image under this directory in parallel")
+    parser.add_argument("--filters", default="blur",
+                        help=f"comma-separated: {', '.join(BATCH_FILTERS)}")
+    parser.add_argument("--out-dir", help="output root (default: <input-dir>_filtered)")
+    parser.add_argument("--workers", type=int, help="worker processes (default: CPU count)")
+    parser.add_argument("--check", choices=CHECKS, default="mtime",
+                        help="how to skip images whose outputs are up to date")
+    args = parser.parse_args()
+    if args.input_dir:
+        filters = [f.strip().lower() for f in args.filters.split(",") if f.strip()]
+        unknown = [f for f in filters if f not in BATCH_FILTERS]
+        if unknown or not filters:
+            parser.error(f"Unknown filter(s) {unknown}. Choose from: {', '.join(BATCH_FILTERS)}")
+        report = run_batch(partial(batch_job, filters=filters),
+                           [BATCH_FILTERS[f][1] for f in filters],
+                           args.input_dir, args.out_dir, args.workers, args.check)
+        print_batch_report(report)
+        raise SystemExit(1 if report["failed"] else 0)
+
     print("Image Blur Processor (type 'exit' to quit)\n")
     while True:
         image_path = input("Enter image filename (or 'exit' to quit): ").strip()
@@ -0,0 +1,135 @@
+from PIL import Image
+import numpy as np
+import glob
+import os
+import sys
+import tempfile
+import time
+
+# --------- Output settings ---------
+jpeg_quality = 95  # 1-95; higher is larger and closer to the original
+png_compress_level = 6  # 0 (fastest, largest) to 9 (slowest, smallest)
+
+def to_image(pixels):
+    """Return a PIL image for a PIL image or a uint8 array (H x W or H x W x 3/4)."""
+    if isinstance(pixels, Image.Image):
+        return pixels
+    return Image.fromarray(np.ascontiguousarray(pixels, dtype=np.uint8))
+
+def save_image(pixels, output_path, fmt=None, quality=None, size=None):
+    """
+    Encode pixels straight to a file, without rendering a figure.
+
+    Args:
+        pixels (PIL.Image.Image | np.ndarray): The image; arrays are uint8 RGB,
+            RGBA or grayscale.
+        output_path (str): Destination; the format follows its extension
+            unless fmt is given.
+        fmt (str | None): PIL format name, e.g. "JPEG", "PNG" or "WEBP".
+        quality (int | None): JPEG/WebP quality; defaults to jpeg_quality.
+        size (Tuple[int, int] | None): Exact (width, height) to write; the
+            image's own size is kept when None.
+    """
+    img = to_image(pixels)
+    if size is not None and img.size != tuple(size):
+        img = img.resize(tuple(size), Image.LANCZOS)
+    fmt = (fmt or Image.registered_extensions().get(
+        os.path.splitext(output_path)[1].lower(), "PNG")).upper()
+    options = {}
+    if fmt in ("JPEG", "WEBP"):
+        options["quality"] = quality if quality is not None else jpeg_quality
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+    elif fmt == "PNG":
+        options["compress_level"] = png_compress_level
+    img.save(output_path, format=fmt, **options)
+
+# --------- Heatmap overlay ---------
+def _jet_lut():
+    # Breakpoints of matplotlib's "jet" colormap, per channel
+    segments = (
+        ((0.0, 0.35, 0.66, 0.89, 1.0), (0.0, 0.0, 1.0, 1.0, 0.5)),
+        ((0.0, 0.125, 0.375, 0.64, 0.91, 1.0), (0.0, 0.0, 1.0, 1.0, 0.0, 0.0)),
+        ((0.0, 0.11, 0.34, 0.65, 1.0), (0.5, 1.0, 1.0, 0.0, 0.0)),
+    )
+    x = np.linspace(0.0, 1.0, 256)
+    channels = [np.interp(x, xp, fp) for xp, fp in segments]
+    return (np.stack(channels, axis=-1) * 255 + 0.5).astype(np.uint8)
+
+JET_LUT = _jet_lut()
+
+def apply_colormap(values, lut=JET_LUT):
+    """Map values in [0, 1] to uint8 RGB colors with a single table lookup."""
+    index = (np.clip(values, 0, 1) * 255 + 0.5).astype(np.uint8)
+    return lut[index]
+
+def overlay_heatmap(image_rgb, heatmap, alpha=0.4, lut=JET_LUT):
+    """
+    Blend a colorized heatmap over an image.
+
+    Args:
+        image_rgb (np.ndarray): uint8 RGB image, H x W x 3.
+        heatmap (np.ndarray): Values in [0, 1] at any resolution; resized
+            bilinearly to the image.
+        alpha (float): Weight of the heatmap colors.
+        lut (np.ndarray): 256 x 3 uint8 colormap.
+
+    Returns:
+        np.ndarray: The uint8 RGB overlay, same size as image_rgb.
+    """
+    h, w = image_rgb.shape[:2]
+    resized = Image.fromarray(np.asarray(heatmap, dtype=np.float32), mode="F")
+    resized = np.asarray(resized.resize((w, h), Image.BILINEAR))
+    colors = apply_colormap(resized, lut)
+    # Integer blend in uint16: (image * (256 - a) + colors * a) / 256
+    a = int(round(alpha * 256))
+    blended = image_rgb.astype(np.uint16) * (256 - a) + colors.astype(np.uint16) * a
+    return (blended >> 8).astype(np.uint8)
+
+# --------- Benchmark ---------
+def save_with_matplotlib(pixels, output_path):
+    """The previous output path: render the pixels into a figure and save that."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    plt.imshow(pixels)
+    plt.axis('off')
+    plt.savefig(output_path, bbox_inches='tight', pad_inches=0)
+    plt.close()
+
+def benchmark_savers(image_paths, repeat=3, ext=".jpg"):
+    """
+    Compare images/sec of save_image() and the matplotlib path, plus heatmap overlays.
+
+    Returns:
+        dict: Images/sec for "matplotlib", "direct" and "overlay" (a
+        save_image() of overlay_heatmap() on each image).
+    """
+    images = [np.array(Image.open(p).convert("RGB")) for p in image_paths]
+    heatmap = np.random.default_rng(0).random((7, 7)).astype(np.float32)
+    methods = {
+        "matplotlib": lambda img, path: save_with_matplotlib(img, path),
+        "direct": lambda img, path: save_image(img, path),
+        "overlay": lambda img, path: save_image(overlay_heatmap(img, heatmap), path),
+    }
+    results = {}
+    with tempfile.TemporaryDirectory() as out_dir:
+        for name, method in methods.items():
+            start = time.perf_counter()
+            for r in range(repeat):
+                for n, img in enumerate(images):
+                    method(img, os.path.join(out_dir, f"{name}-{n}{ext}"))
+            results[name] = repeat * len(images) / (time.perf_counter() - start)
+    return results
+
+if __name__ == "__main__":
+    # python image_io.py [image files...]; defaults to the .jpg files here
+    paths = sys.argv[1:] or sorted(glob.glob("*.jpg"))
+    if not paths:
+        print("No images to benchmark.")
+        sys.exit(1)
+    results = benchmark_savers(paths)
+    print(f"Saved {len(paths)} images: matplotlib {results['matplotlib']:.1f}/s, "
+          f"direct {results['direct']:.1f}/s ({results['direct'] / results['matplotlib']:.1f}x), "
+          f"heatmap overlay + save {results['overlay']:.1f}/s")
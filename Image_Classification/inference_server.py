@@ -0,0 +1,540 @@
+from PIL import Image
+import numpy as np
+import argparse
+import collections
+import io
+import json
+import queue
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# --------- Server settings ---------
+host = "127.0.0.1"
+port = 8500
+max_batch_size = 32  # images per model call
+max_wait_ms = 5.0  # longest the oldest queued request waits for a batch to fill
+max_queue = 256  # queued requests beyond this are refused with 503
+request_timeout = 30.0  # seconds a request waits for its prediction
+input_size = (224, 224)
+latency_window = 10000  # recent requests kept for the latency percentiles
+# base_classifier.BACKENDS, repeated so the CLI does not import TensorFlow
+BACKENDS = ("keras", "tflite-dynamic", "tflite-int8")
+
+# --------- Micro-batching ---------
+class QueueFull(Exception):
+    pass
+
+def bucket_sizes(limit):
+    """Batch sizes the model is called with: powers of two up to limit, and limit."""
+    sizes = [1]
+    while sizes[-1] * 2 < limit:
+        sizes.append(sizes[-1] * 2)
+    if sizes[-1] != limit:
+        sizes.append(limit)
+    return sizes
+
+def percentiles(samples):
+    """Return the p50, p95 and p99 of a list of seconds, in milliseconds."""
+    if not samples:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None}
+    values = np.percentile(np.array(samples) * 1000, [50, 95, 99])
+    return {"p50_ms": float(values[0]), "p95_ms": float(values[1]), "p99_ms": float(values[2])}
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single-image requests into batched model calls.
+
+    One background thread owns the model. It takes the oldest queued request,
+    then keeps collecting until max_batch_size requests are in hand or that
+    request has waited max_wait_ms, and runs them as one batch. Batches are
+    zero-padded up to the next bucket size, so the model only ever sees a
+    few shapes, each compiled once by warm_up().
+
+    Args:
+        predict_fn (callable): Maps a float32 batch (n, *input shape) to
+            predictions (n, classes).
+        max_batch_size (int): Largest batch per model call.
+        max_wait_ms (float): Longest a request waits for others to join it.
+        max_queue (int): Queued requests beyond this are refused with QueueFull.
+    """
+    def __init__(self, predict_fn, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms,
+                 max_queue=max_queue):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.buckets = bucket_sizes(max_batch_size)
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.counts = collections.Counter()
+        self.batch_sizes = collections.Counter()
+        self.max_depth = 0
+        self.queue_wait = collections.deque(maxlen=latency_window)
+        self.total = collections.deque(maxlen=latency_window)
+        self.inference = collections.deque(maxlen=latency_window)
+
+    def warm_up(self, input_shape):
+        """Call the model once at every bucket size, so no request pays for compilation."""
+        for size in self.buckets:
+            self.predict_fn(np.zeros((size, *input_shape), dtype=np.float32))
+
+    def start(self):
+        self.started = time.perf_counter()
+        self.thread.start()
+        return self
+
+    def stop(self, timeout=request_timeout):
+        """
+        Finish the queued requests, then end the model thread.
+
+        Never blocks on a full queue: the wake-up sentinel is dropped when
+        there is no room for it, and the thread sees the stopping flag once
+        the queue drains. Waits at most timeout seconds for the thread.
+        """
+        self.stopping.set()
+        try:
+            self.queue.put_nowait(None)
+        except queue.Full:
+            pass
+        self.thread.join(timeout)
+
+    def submit(self, x):
+        """Queue one preprocessed input; returns a Future for its prediction row."""
+        future = Future()
+        try:
+            self.queue.put_nowait((x, future, time.perf_counter()))
+        except queue.Full:
+            with self.lock:
+                self.counts["rejected"] += 1
+            raise QueueFull(f"{self.queue.maxsize} requests already queued")
+        with self.lock:
+            self.max_depth = max(self.max_depth, self.queue.qsize())
+        return future
+
+    def predict(self, x, timeout=request_timeout):
+        return self.submit(x).result(timeout)
+
+    def _collect(self):
+        while True:
+            try:
+                first = self.queue.get(timeout=0.1)
+                break
+            except queue.Empty:
+                if self.stopping.is_set():
+                    return None, True
+        if first is None:
+            return None, True
+        batch = [first]
+        deadline = first[2] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                # Past the deadline, still take whatever is already queued
+                item = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch, stopping = self._collect()
+            if not batch:
+                continue
+            n = len(batch)
+            inputs = np.stack([x for x, _, _ in batch])
+            size = next(s for s in self.buckets if s >= n)
+            if size > n:
+                inputs = np.concatenate([inputs, np.zeros((size - n, *inputs.shape[1:]),
+                                                          dtype=inputs.dtype)])
+            start = time.perf_counter()
+            try:
+                outputs = np.asarray(self.predict_fn(inputs))[:n]
+            except Exception as e:
+                with self.lock:
+                    self.counts["errors"] += n
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            done = time.perf_counter()
+            with self.lock:
+                self.counts["requests"] += n
+                self.counts["batches"] += 1
+                self.batch_sizes[n] += 1
+                self.inference.append(done - start)
+                for _, _, queued in batch:
+                    self.queue_wait.append(start - queued)
+                    self.total.append(done - queued)
+            for (_, future, _), row in zip(batch, outputs):
+                future.set_result(row)
+
+    def metrics(self):
+        """
+        Return counters and latencies since start().
+
+        Returns:
+            dict: "requests", "batches", "errors", "rejected",
+            "queue_depth" (now) and "max_queue_depth", "avg_batch_size",
+            "batch_sizes", "requests_per_sec", and p50/p95/p99 of
+            "queue_wait" and "total" per request and "inference" per batch.
+        """
+        with self.lock:
+            uptime = time.perf_counter() - self.started
+            requests = self.counts["requests"]
+            return {
+                "requests": requests,
+                "batches": self.counts["batches"],
+                "errors": self.counts["errors"],
+                "rejected": self.counts["rejected"],
+                "queue_depth": self.queue.qsize(),
+                "max_queue_depth": self.max_depth,
+                "avg_batch_size": requests / max(1, self.counts["batches"]),
+                "batch_sizes": {str(k): v for k, v in sorted(self.batch_sizes.items())},
+                "requests_per_sec": requests / uptime if uptime else 0.0,
+                "uptime_s": uptime,
+                "queue_wait": percentiles(list(self.queue_wait)),
+                "inference": percentiles(list(self.inference)),
+                "total": percentiles(list(self.total)),
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+            }
+
+# --------- Model ---------
+def decode_image(data, size=input_size):
+    """Decode image bytes to a uint8 RGB array resized like keras' load_img(target_size=size)."""
+    img = Image.open(io.BytesIO(data))
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    return np.asarray(img.resize(size, Image.NEAREST))
+
+def load_classifier(backend="keras", calibration_dir=None):
+    """
+    Load the MobileNetV2 classifier once for this process.
+
+    Args:
+        backend (str): One of base_classifier.BACKENDS. A TFLite interpreter
+            is not thread-safe, which suits the batcher's single model thread.
+        calibration_dir (str | None): Sample images for tflite-int8.
+
+    Returns:
+        Tuple[callable, callable, callable]: predict_fn for MicroBatcher,
+        preprocess (uint8 image -> model input) and postprocess
+        (prediction row, top_k -> list of "class_id", "label", "score").
+    """
+    # The model is built when base_classifier is imported
+    import base_classifier
+    from base_classifier import preprocess_input, decode_predictions
+
+    base_classifier.set_backend(backend, calibration_dir)
+    predictor = base_classifier.predictor
+
+    def predict_fn(batch):
+        return predictor.predict_on_batch(batch)
+
+    def preprocess(pixels):
+        return preprocess_input(pixels.astype(np.float32))
+
+    def postprocess(row, top_k):
+        return [{"class_id": class_id, "label": label, "score": float(score)}
+                for class_id, label, score in decode_predictions(row[None], top=top_k)[0]]
+
+    return predict_fn, preprocess, postprocess
+
+# --------- HTTP server ---------
+class InferenceHandler(BaseHTTPRequestHandler):
+    """
+    POST /predict?top_k=3 with image bytes as the body returns the top
+    predictions as JSON; GET /metrics returns MicroBatcher.metrics() and
+    GET /health returns {"status": "ok"}.
+
+    Decoding and preprocessing run on the request's own thread, so only the
+    model call is serialized through the batcher.
+    """
+    batcher = None
+    preprocess = None
+    postprocess = None
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/metrics":
+            self.send_json(200, self.batcher.metrics())
+        elif path == "/health":
+            self.send_json(200, {"status": "ok"})
+        else:
+            self.send_json(404, {"error": f"no such endpoint: {path}"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/predict":
+            self.send_json(404, {"error": f"no such endpoint: {url.path}"})
+            return
+        start = time.perf_counter()
+        try:
+            top_k = int(parse_qs(url.query).get("top_k", ["3"])[0])
+            data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            x = type(self).preprocess(decode_image(data))
+        except Exception as e:
+            self.send_json(400, {"error": f"could not read image: {e}"})
+            return
+        try:
+            row = self.batcher.predict(x)
+        except QueueFull as e:
+            self.send_json(503, {"error": f"server busy: {e}"})
+            return
+        except Exception as e:
+            self.send_json(500, {"error": f"{type(e).__name__}: {e}"})
+            return
+        self.send_json(200, {"predictions": type(self).postprocess(row, top_k),
+                             "latency_ms": (time.perf_counter() - start) * 1000})
+
+    def log_message(self, format, *args):
+        pass
+
+class InferenceHTTPServer(ThreadingHTTPServer):
+    # Room in the listen backlog for a burst of clients connecting at once
+    request_queue_size = 128
+
+def serve(batcher, preprocess, postprocess, host=host, port=port):
+    """
+    Start the HTTP server for a started batcher in a background thread.
+
+    Returns:
+        ThreadingHTTPServer: The running server. Call shutdown() to stop it.
+    """
+    handler = type("Handler", (InferenceHandler,), {
+        "batcher": batcher,
+        # staticmethod keeps the functions from binding to the handler instance
+        "preprocess": staticmethod(preprocess),
+        "postprocess": staticmethod(postprocess),
+    })
+    server = InferenceHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+# --------- Load test ---------
+def post_image(url, data, top_k=3, timeout=request_timeout):
+    request = urllib.request.Request(f"{url.rstrip('/')}/predict?top_k={top_k}", data=data,
+                                     headers={"Content-Type": "application/octet-stream"})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())
+
+def load_test(url, payloads, clients=16, requests_per_client=20):
+    """
+    Send images from many concurrent clients and measure what they see.
+
+    Args:
+        url (str): Server root, e.g. http://127.0.0.1:8500.
+        payloads (List[bytes]): Encoded images, sent round-robin.
+        clients (int): Concurrent clients, each sending one request at a time.
+        requests_per_client (int): Requests per client.
+
+    Returns:
+        dict: "requests", "failed", "seconds", "requests_per_sec", client
+        "latency" percentiles, the server's "metrics" afterwards and
+        "responses" as (payload index, response) pairs.
+    """
+    def client(c):
+        out = []
+        for r in range(requests_per_client):
+            index = (c * requests_per_client + r) % len(payloads)
+            start = time.perf_counter()
+            try:
+                response = post_image(url, payloads[index])
+            except (urllib.error.URLError, OSError) as e:
+                response = {"error": str(e)}
+            out.append((index, response, time.perf_counter() - start))
+        return out
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        results = [r for batch in pool.map(client, range(clients)) for r in batch]
+    seconds = time.perf_counter() - start
+    with urllib.request.urlopen(f"{url.rstrip('/')}/metrics") as response:
+        metrics = json.loads(response.read())
+    return {
+        "requests": len(results),
+        "failed": sum(1 for _, response, _ in results if "error" in response),
+        "seconds": seconds,
+        "requests_per_sec": len(results) / seconds,
+        "latency": percentiles([t for _, _, t in results]),
+        "metrics": metrics,
+        "responses": [(index, response) for index, response, _ in results],
+    }
+
+def print_load_test(result):
+    latency = result["latency"]
+    metrics = result["metrics"]
+    print(f"{result['requests']} requests ({result['failed']} failed) in {result['seconds']:.2f}s: "
+          f"{result['requests_per_sec']:.1f} requests/s, latency p50 {latency['p50_ms']:.1f} ms, "
+          f"p95 {latency['p95_ms']:.1f} ms, p99 {latency['p99_ms']:.1f} ms; "
+          f"average batch {metrics['avg_batch_size']:.1f}, "
+          f"max queue depth {metrics['max_queue_depth']}")
+
+# --------- Self-test ---------
+def run_self_test():
+    """
+    Serve a stand-in model and check batching, routing and back-pressure.
+
+    The stand-in costs a fixed 20 ms per call plus 0.5 ms per image, like a
+    real model whose per-call overhead dominates at small batches, and
+    predicts each image's gray level as its class, so every response can be
+    checked against the image that was sent.
+
+    Returns:
+        bool: True if every check passed.
+    """
+    def predict_fn(batch):
+        time.sleep(0.02 + 0.0005 * len(batch))
+        levels = np.rint((batch.mean(axis=(1, 2, 3)) + 1) * 127.5).astype(int)
+        out = np.zeros((len(batch), 1000), dtype=np.float32)
+        out[np.arange(len(batch)), levels] = 1
+        return out
+
+    def preprocess(pixels):
+        return pixels.astype(np.float32) / 127.5 - 1
+
+    def postprocess(row, top_k):
+        return [{"class_id": int(i), "label": f"level_{i}", "score": float(row[i])}
+                for i in np.argsort(-row)[:top_k]]
+
+    payloads = []
+    for level in range(0, 256, 8):
+        buffer = io.BytesIO()
+        Image.new("RGB", (64, 48), (level, level, level)).save(buffer, format="PNG")
+        payloads.append(buffer.getvalue())
+
+    checks = []
+    throughput = {}
+    for batch_size in (1, 16):
+        batcher = MicroBatcher(predict_fn, max_batch_size=batch_size, max_wait_ms=5).start()
+        server = serve(batcher, preprocess, postprocess, port=0)
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        try:
+            result = load_test(url, payloads, clients=16, requests_per_client=10)
+        finally:
+            server.shutdown()
+            server.server_close()
+            batcher.stop()
+        throughput[batch_size] = result["requests_per_sec"]
+        wrong = sum(1 for index, response in result["responses"]
+                    if "error" in response or response["predictions"][0]["class_id"] != index * 8)
+        checks.append((wrong == 0 and not result["failed"],
+                       f"max batch {batch_size}: {result['requests']} responses, "
+                       f"{wrong} wrong or failed"))
+        print_load_test(result)
+        if batch_size > 1:
+            checks.append((result["metrics"]["avg_batch_size"] > 2,
+                           f"average batch size {result['metrics']['avg_batch_size']:.1f} "
+                           f"with 16 concurrent clients"))
+    checks.append((throughput[16] > 2 * throughput[1],
+                   f"batching raised throughput {throughput[16] / throughput[1]:.1f}x "
+                   f"({throughput[1]:.0f} -> {throughput[16]:.0f} requests/s)"))
+
+    # A full queue refuses new work instead of growing without bound
+    gate = threading.Event()
+    batcher = MicroBatcher(lambda batch: gate.wait() and predict_fn(batch),
+                           max_batch_size=1, max_queue=2).start()
+    x = preprocess(decode_image(payloads[1]))
+    futures = [batcher.submit(x)]
+    time.sleep(0.05)  # let the batcher take the first request
+    futures += [batcher.submit(x), batcher.submit(x)]
+    try:
+        batcher.submit(x)
+        refused = False
+    except QueueFull:
+        refused = True
+    gate.set()
+    served = all(f.result(5)[8] == 1 for f in futures)
+    batcher.stop()
+    checks.append((refused and served and batcher.metrics()["rejected"] == 1,
+                   "full queue refuses new requests and still serves queued ones"))
+
+    # stop() returns while the queue is full, and queued requests are still served
+    gate = threading.Event()
+    batcher = MicroBatcher(lambda batch: gate.wait() and predict_fn(batch),
+                           max_batch_size=1, max_queue=1).start()
+    futures = [batcher.submit(x)]
+    time.sleep(0.05)
+    futures.append(batcher.submit(x))
+    start = time.perf_counter()
+    batcher.stop(timeout=0.2)
+    stop_seconds = time.perf_counter() - start
+    gate.set()
+    served = all(f.result(5)[8] == 1 for f in futures)
+    batcher.thread.join(5)
+    checks.append((stop_seconds < 1 and served and not batcher.thread.is_alive(),
+                   f"stop() with a full queue returned in {stop_seconds:.2f}s and "
+                   f"the queued requests were served"))
+
+    for passed, message in checks:
+        print(f"{'PASS' if passed else 'FAIL'}: {message}")
+    return all(passed for passed, _ in checks)
+
+# --------- CLI ---------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the MobileNetV2 classifier over HTTP "
+                                                 "with dynamic micro-batching.")
+    parser.add_argument("--host", default=host)
+    parser.add_argument("--port", type=int, default=port)
+    parser.add_argument("--max-batch-size", type=int, default=max_batch_size)
+    parser.add_argument("--max-wait-ms", type=float, default=max_wait_ms)
+    parser.add_argument("--max-queue", type=int, default=max_queue)
+    parser.add_argument("--backend", choices=BACKENDS, default="keras",
+                        help="prediction backend (see base_classifier.py)")
+    parser.add_argument("--calibration-dir", help="sample images for tflite-int8")
+    parser.add_argument("--load-test", nargs="+", metavar=("URL", "IMAGE"),
+                        help="send these images to a running server from many clients")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=20, help="requests per client")
+    parser.add_argument("--test", action="store_true",
+                        help="check the server against a stand-in model and exit")
+    args = parser.parse_args()
+
+    if args.test:
+        raise SystemExit(0 if run_self_test() else 1)
+    if args.load_test:
+        if len(args.load_test) < 2:
+            parser.error("--load-test needs a URL and at least one image")
+        url, *image_paths = args.load_test
+        payloads = []
+        for path in image_paths:
+            with open(path, "rb") as f:
+                payloads.append(f.read())
+        result = load_test(url, payloads, args.clients, args.requests)
+        print_load_test(result)
+        print(json.dumps({k: v for k, v in result.items() if k != "responses"}))
+        raise SystemExit(0)
+
+    predict_fn, preprocess, postprocess = load_classifier(args.backend, args.calibration_dir)
+    batcher = MicroBatcher(predict_fn, args.max_batch_size, args.max_wait_ms, args.max_queue)
+    print(f"Warming up batch sizes {batcher.buckets}...")
+    batcher.warm_up((*input_size, 3))
+    batcher.start()
+    server = serve(batcher, preprocess, postprocess, args.host, args.port)
+    print(f"Serving on http://{args.host}:{server.server_address[1]} "
+          f"(POST /predict, GET /metrics, GET /health); Ctrl+C to stop")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        print("Stopping...")
+    finally:
+        server.shutdown()
+        batcher.stop()
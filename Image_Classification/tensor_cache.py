@@ -0,0 +1,262 @@
+import glob
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# --- Settings ---
+cache_dir = "tensor_cache"
+max_mb = 1024  # total shard size kept on disk
+shard_size = 64  # tensors per shard file (64 x 224x224x3 float32 = 37 MB)
+INDEX_FILE = "index.json"
+
+# --- Preprocessed tensor cache ---
+# Tensors are stored in fixed-size .npy shards opened as memory maps, so a hit
+# reads just its own rows from the page cache. Keys hash the file contents
+# (plus a variant naming the preprocessing), so renamed or copied images hit
+# and edited images miss. Eviction drops whole shards, least recently used
+# first, once the shards would exceed max_mb. One process uses a cache
+# directory at a time.
+
+def file_digest(path, chunk=1 << 20):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class TensorCache:
+    """
+    Content-hash-keyed store of same-shaped arrays in memory-mapped .npy shards.
+
+    Args:
+        directory (str): Cache directory, created if needed.
+        shape (Tuple[int, ...]): Shape of every stored tensor.
+        dtype: Stored dtype.
+        max_mb (float): Size bound for all shards together.
+        shard_size (int): Tensors per shard.
+    """
+    def __init__(self, directory=cache_dir, shape=(224, 224, 3), dtype=np.float32,
+                 max_mb=max_mb, shard_size=shard_size):
+        self.directory = directory
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.shard_size = shard_size
+        self.shard_bytes = shard_size * int(np.prod(self.shape)) * self.dtype.itemsize
+        self.max_shards = max(1, int(max_mb * 2**20 // self.shard_bytes))
+        self.hits = self.misses = self.evictions = 0
+        self._readers = {}
+        self._writer = None  # (shard id, writable memmap) of the shard being filled
+        os.makedirs(directory, exist_ok=True)
+        self.index = self._load_index()
+        # Shard files the index does not know (e.g. from an interrupted run)
+        for name in os.listdir(directory):
+            if name.endswith(".npy") and name[:-4] not in self.index["shards"]:
+                os.remove(os.path.join(directory, name))
+
+    def _load_index(self):
+        empty = {"shape": list(self.shape), "dtype": self.dtype.str, "shard_size": self.shard_size,
+                 "next_shard": 0, "shards": {}, "entries": {}, "hints": {}}
+        try:
+            with open(os.path.join(self.directory, INDEX_FILE), "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return empty
+        if (index.get("shape") != empty["shape"] or index.get("dtype") != empty["dtype"]
+                or index.get("shard_size") != self.shard_size):
+            # Stored with other settings: start over (the orphaned shards are removed)
+            index = empty
+        return index
+
+    def save(self):
+        """Flush the shard being written and persist the index."""
+        if self._writer is not None:
+            self._writer[1].flush()
+        path = os.path.join(self.directory, INDEX_FILE)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.index, f)
+        os.replace(path + ".tmp", path)
+
+    def _shard_path(self, shard):
+        return os.path.join(self.directory, f"{shard}.npy")
+
+    def key(self, path, variant=""):
+        """
+        Cache key for an image file: its content hash plus the preprocessing variant.
+
+        The hash is remembered per (path, size, mtime), so unchanged files are
+        not re-read.
+        """
+        stat = os.stat(path)
+        hint = self.index["hints"].get(os.path.abspath(path))
+        if hint and hint[0] == stat.st_size and hint[1] == stat.st_mtime_ns:
+            digest = hint[2]
+        else:
+            digest = file_digest(path)
+            self.index["hints"][os.path.abspath(path)] = [stat.st_size, stat.st_mtime_ns, digest]
+        return f"{digest}:{variant}" if variant else digest
+
+    def get(self, key):
+        """Return the stored tensor as a read-only memory-mapped view, or None."""
+        entry = self.index["entries"].get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        shard, slot = entry
+        if self._writer is not None and self._writer[0] == shard:
+            rows = self._writer[1]
+        else:
+            if shard not in self._readers:
+                self._readers[shard] = np.load(self._shard_path(shard), mmap_mode="r")
+            rows = self._readers[shard]
+        self.index["shards"][shard]["last_used"] = time.time()
+        self.hits += 1
+        return rows[slot]
+
+    def put(self, key, tensor):
+        """Store a tensor under key, evicting least recently used shards if needed."""
+        if key in self.index["entries"]:
+            return
+        tensor = np.asarray(tensor, dtype=self.dtype)
+        if tensor.shape != self.shape:
+            raise ValueError(f"Expected a tensor of shape {self.shape}, got {tensor.shape}.")
+        if self._writer is None or self.index["shards"][self._writer[0]]["used"] >= self.shard_size:
+            self._new_shard()
+        shard, rows = self._writer
+        info = self.index["shards"][shard]
+        rows[info["used"]] = tensor
+        self.index["entries"][key] = [shard, info["used"]]
+        info["used"] += 1
+        info["last_used"] = time.time()
+
+    def _new_shard(self):
+        if self._writer is not None:
+            self._writer[1].flush()
+        else:
+            # Keep filling the newest shard of an earlier run if it has room
+            shards = self.index["shards"]
+            newest = max(shards, key=int, default=None)
+            if newest is not None and shards[newest]["used"] < self.shard_size:
+                self._readers.pop(newest, None)
+                self._writer = (newest, np.load(self._shard_path(newest), mmap_mode="r+"))
+                return
+        while len(self.index["shards"]) >= self.max_shards:
+            self._evict(min(self.index["shards"], key=lambda s: self.index["shards"][s]["last_used"]))
+        shard = str(self.index["next_shard"])
+        self.index["next_shard"] += 1
+        rows = np.lib.format.open_memmap(self._shard_path(shard), mode="w+", dtype=self.dtype,
+                                         shape=(self.shard_size, *self.shape))
+        self.index["shards"][shard] = {"used": 0, "last_used": time.time()}
+        self._writer = (shard, rows)
+
+    def _evict(self, shard):
+        self._readers.pop(shard, None)
+        if self._writer is not None and self._writer[0] == shard:
+            self._writer = None
+        del self.index["shards"][shard]
+        removed = {k.split(":", 1)[0] for k, v in self.index["entries"].items() if v[0] == shard}
+        self.index["entries"] = {k: v for k, v in self.index["entries"].items() if v[0] != shard}
+        # Forget the hashes of the files that were left without any entry
+        gone = removed - {k.split(":", 1)[0] for k in self.index["entries"]}
+        self.index["hints"] = {p: h for p, h in self.index["hints"].items() if h[2] not in gone}
+        try:
+            os.remove(self._shard_path(shard))
+        except OSError:
+            pass
+        self.evictions += 1
+
+    def load(self, path, compute, variant=""):
+        """
+        Return the cached tensor for an image file, computing and storing it on a miss.
+
+        Args:
+            path (str): Image file.
+            compute (callable): compute(path) -> tensor, called only on a miss.
+            variant (str): Names the preprocessing, so different pipelines
+                never share entries.
+        """
+        key = self.key(path, variant)
+        tensor = self.get(key)
+        if tensor is None:
+            tensor = np.asarray(compute(path), dtype=self.dtype)
+            self.put(key, tensor)
+        return tensor
+
+    def stats(self):
+        entries = len(self.index["entries"])
+        return {"entries": entries, "shards": len(self.index["shards"]),
+                "size_mb": len(self.index["shards"]) * self.shard_bytes / 2**20,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+# --- Self-test ---
+def run_self_test():
+    """
+    Round-trip the sample images in this directory through a temporary cache.
+
+    Tensors are prepared as MobileNetV2 inputs (NEAREST resize, then scaled
+    to [-1, 1] as preprocess_input does) with PIL alone, so no TensorFlow is
+    needed.
+
+    Returns:
+        bool: True if every check passed.
+    """
+    from PIL import Image
+
+    def prepare(path):
+        with Image.open(path) as img:
+            pixels = np.asarray(img.convert("RGB").resize((224, 224), Image.NEAREST))
+        return pixels.astype(np.float32) / 127.5 - 1
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    paths = sorted(glob.glob(os.path.join(here, "*.jpg")))[:4]
+    if len(paths) < 3:
+        print("SKIP: needs at least 3 .jpg images next to tensor_cache.py")
+        return True
+    expected = [prepare(p) for p in paths]
+    checks = []
+    with tempfile.TemporaryDirectory() as directory:
+        cache = TensorCache(os.path.join(directory, "cache"), shard_size=2)
+        for path in paths:
+            cache.load(path, prepare, "test")
+        cache.save()
+
+        # A fresh instance reads the saved index and shards
+        cache = TensorCache(os.path.join(directory, "cache"), shard_size=2)
+        loaded = [cache.load(p, lambda p: np.zeros(cache.shape), "test") for p in paths]
+        checks.append((cache.hits == len(paths) and cache.misses == 0
+                       and all(np.array_equal(a, b) for a, b in zip(loaded, expected)),
+                       f"{cache.hits} of {len(paths)} tensors read back identical after reopening"))
+
+        copy = os.path.join(directory, "renamed.jpg")
+        shutil.copyfile(paths[0], copy)
+        checks.append((cache.get(cache.key(copy, "test")) is not None
+                       and cache.get(cache.key(paths[0], "other")) is None,
+                       "a renamed copy hits, another variant misses"))
+
+        # Room for one 2-tensor shard: the third image evicts the first shard
+        one_shard = 2 * 224 * 224 * 3 * 4 / 2**20
+        cache = TensorCache(os.path.join(directory, "small"), max_mb=one_shard, shard_size=2)
+        for path in paths[:3]:
+            cache.load(path, prepare, "test")
+        evicted = {file_digest(p) for p in paths[:2]}
+        stale = [p for p, h in cache.index["hints"].items() if h[2] in evicted]
+        checks.append((cache.evictions == 1 and len(cache.index["entries"]) == 1
+                       and not stale and os.path.abspath(paths[2]) in cache.index["hints"],
+                       f"eviction dropped {len(paths[:2])} entries and their file hashes"))
+        del cache, loaded
+
+    for passed, message in checks:
+        print(f"{'PASS' if passed else 'FAIL'}: {message}")
+    return all(passed for passed, _ in checks)
+
+if __name__ == "__main__":
+    # python tensor_cache.py --test
+    if sys.argv[1:] != ["--test"]:
+        print("Usage: python tensor_cache.py --test")
+        sys.exit(2)
+    sys.exit(0 if run_self_test() else 1)
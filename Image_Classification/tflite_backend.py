@@ -0,0 +1,251 @@
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+try:
+    import tensorflow as tf
+except ImportError:  # lets --test report the skip instead of failing to import
+    tf = None
+
+# --- Settings ---
+tflite_dir = "tflite_models"  # converted models are cached here
+calibration_images = 200  # most images used to calibrate full-int8 quantization
+num_threads = os.cpu_count()  # interpreter threads
+QUANTIZATION_MODES = ("dynamic", "int8")
+
+# --- Quantized TFLite backend ---
+# "dynamic": weights stored as int8, activations computed in float at run
+# time; needs no calibration data. "int8": weights and activations in int8,
+# with activation ranges calibrated on sample images. Both keep float32
+# inputs and outputs, so the backend takes the same preprocessed batches as
+# the Keras model.
+
+def load_calibration_images(paths, size=(224, 224), limit=calibration_images):
+    """Yield preprocessed single-image batches, prepared as in classify_image()."""
+    preprocess_input = tf.keras.applications.mobilenet_v2.preprocess_input
+    for path in paths[:limit]:
+        img = tf.keras.preprocessing.image.load_img(path, target_size=size)
+        x = tf.keras.preprocessing.image.img_to_array(img)
+        yield [preprocess_input(x)[None].astype(np.float32)]
+
+def artifact_path(model, mode, calibration_paths=(), cache_dir=None):
+    """
+    Cache file for a converted model.
+
+    The name changes whenever the weights, the TensorFlow version, the mode
+    or (for int8) the calibration files change, so a stale conversion is
+    never reused.
+    """
+    key = hashlib.sha1()
+    key.update(f"{tf.__version__}:{mode}:{model.name}".encode())
+    for weights in model.get_weights():
+        key.update(weights.tobytes())
+    if mode == "int8":
+        for path in sorted(calibration_paths)[:calibration_images]:
+            stat = os.stat(path)
+            key.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return os.path.join(cache_dir or tflite_dir, f"{model.name}-{mode}-{key.hexdigest()[:12]}.tflite")
+
+def convert(model, mode="dynamic", calibration_paths=()):
+    """Convert a Keras model to TFLite with post-training quantization; returns the flatbuffer bytes."""
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(f"Unknown quantization '{mode}'. Choose from: {', '.join(QUANTIZATION_MODES)}")
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if mode == "int8":
+        if not calibration_paths:
+            raise ValueError("int8 quantization needs calibration images (--calibration-dir).")
+        converter.representative_dataset = lambda: load_calibration_images(sorted(calibration_paths))
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    return converter.convert()
+
+def load_or_convert(model, mode="dynamic", calibration_paths=(), cache_dir=None):
+    """
+    Return the path of the cached TFLite model, converting it on first use.
+
+    Returns:
+        Tuple[str, bool]: The .tflite path and whether it was converted now.
+    """
+    path = artifact_path(model, mode, calibration_paths, cache_dir)
+    if os.path.exists(path):
+        return path, False
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    data = convert(model, mode, calibration_paths)
+    with open(path + ".tmp", "wb") as f:
+        f.write(data)
+    os.replace(path + ".tmp", path)
+    return path, True
+
+class TFLiteClassifier:
+    """
+    TFLite interpreters with Keras' predict_on_batch() interface.
+
+    One interpreter is kept per batch size, each allocated once, so callers
+    that alternate between a few sizes (like the server's bucketed batches)
+    never re-allocate after warming up. Like any TFLite interpreter it must
+    not be called from several threads at once.
+
+    Args:
+        model_path (str): Converted .tflite file.
+        threads (int | None): Threads per interpreter.
+    """
+    def __init__(self, model_path, threads=None):
+        self.model_path = model_path
+        self.threads = threads or num_threads
+        self.interpreters = {}  # batch size -> (interpreter, input details, output details)
+        self._add_interpreter()  # at the converted model's own batch size, usually 1
+
+    def _add_interpreter(self, batch_size=None):
+        interpreter = tf.lite.Interpreter(model_path=self.model_path, num_threads=self.threads)
+        if batch_size is not None:
+            details = interpreter.get_input_details()[0]
+            interpreter.resize_tensor_input(details["index"], [batch_size, *details["shape"][1:]])
+        interpreter.allocate_tensors()
+        details = (interpreter, interpreter.get_input_details()[0],
+                   interpreter.get_output_details()[0])
+        self.interpreters[int(details[1]["shape"][0])] = details
+        return details
+
+    def predict_on_batch(self, images):
+        images = np.asarray(images, dtype=np.float32)
+        interpreter, input_details, output_details = (self.interpreters.get(len(images))
+                                                      or self._add_interpreter(len(images)))
+        # Quantized inputs/outputs, if a model was converted with them
+        scale, zero_point = input_details["quantization"]
+        if input_details["dtype"] != np.float32 and scale:
+            images = np.round(images / scale + zero_point).astype(input_details["dtype"])
+        interpreter.set_tensor(input_details["index"], images)
+        interpreter.invoke()
+        outputs = interpreter.get_tensor(output_details["index"])
+        scale, zero_point = output_details["quantization"]
+        if output_details["dtype"] != np.float32 and scale:
+            outputs = (outputs.astype(np.float32) - zero_point) * scale
+        return outputs
+
+def load_backend(model, mode="dynamic", calibration_paths=(), cache_dir=None):
+    """Build (or load from the cache) a quantized backend for a Keras model."""
+    path, converted = load_or_convert(model, mode, calibration_paths, cache_dir)
+    print(f"{'Converted' if converted else 'Loaded cached'} {mode} TFLite model: {path}")
+    return TFLiteClassifier(path)
+
+# --- Accuracy vs speed ---
+def compare_backends(model, backends, images, batch_size=32, repeat=3):
+    """
+    Compare quantized backends with the Keras model on the same images.
+
+    Every backend is run once to warm it up, then timed over repeat passes.
+
+    Args:
+        model (tf.keras.Model): The float32 reference.
+        backends (dict): Name -> object with predict_on_batch(), e.g. a TFLiteClassifier.
+        images (np.ndarray): Preprocessed images, (n, height, width, 3).
+        batch_size (int): Images per call.
+        repeat (int): Timed passes.
+
+    Returns:
+        List[dict]: One row per backend, Keras first, with "backend",
+        "images_per_sec", "speedup", "size_mb", "top1_agreement" (same top-1
+        class as Keras), "top5_agreement" (Keras' top-1 within the top 5)
+        and "mean_abs_diff" of the probabilities.
+    """
+    def run(predictor):
+        return np.concatenate([np.asarray(predictor.predict_on_batch(images[i:i + batch_size]))
+                               for i in range(0, len(images), batch_size)])
+
+    def size_mb(name, predictor):
+        if name == "keras":
+            return sum(w.nbytes for w in model.get_weights()) / 2**20
+        return os.path.getsize(predictor.model_path) / 2**20
+
+    rows = []
+    reference = None
+    for name, predictor in [("keras", model), *backends.items()]:
+        predictions = run(predictor)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            run(predictor)
+        seconds = (time.perf_counter() - start) / repeat
+        if reference is None:
+            reference, reference_seconds = predictions, seconds
+        top1 = reference.argmax(axis=1)
+        top5 = np.argsort(-predictions, axis=1)[:, :5]
+        rows.append({
+            "backend": name,
+            "images_per_sec": len(images) / seconds,
+            "speedup": reference_seconds / seconds,
+            "size_mb": size_mb(name, predictor),
+            "top1_agreement": float((predictions.argmax(axis=1) == top1).mean()),
+            "top5_agreement": float((top5 == top1[:, None]).any(axis=1).mean()),
+            "mean_abs_diff": float(np.abs(predictions - reference).mean()),
+        })
+    return rows
+
+def print_comparison(rows, images):
+    print(f"{images} images")
+    print(f"{'backend':<10} {'images/s':>9} {'speedup':>8} {'size MB':>8} "
+          f"{'top-1 agree':>12} {'top-5 agree':>12} {'mean |diff|':>12}")
+    for row in rows:
+        print(f"{row['backend']:<10} {row['images_per_sec']:>9.1f} {row['speedup']:>7.2f}x "
+              f"{row['size_mb']:>8.1f} {row['top1_agreement']:>12.1%} "
+              f"{row['top5_agreement']:>12.1%} {row['mean_abs_diff']:>12.2e}")
+    print(json.dumps(rows))
+
+# --- Self-test ---
+def run_self_test(max_images=16):
+    """
+    Convert the real MobileNetV2 in both modes and check it against Keras.
+
+    The sample images in this directory serve as calibration and test
+    images, and conversions go to a temporary directory, so tflite_dir is
+    left untouched.
+
+    Returns:
+        bool: True if every check passed.
+    """
+    # The model is built when base_classifier is imported
+    import base_classifier
+
+    model = base_classifier.model
+    paths = base_classifier.list_images(os.path.dirname(os.path.abspath(__file__)))[:max_images]
+    images = np.stack([base_classifier.prepare(base_classifier.load_rgb(p)) for p in paths])
+    checks = []
+    backends = {}
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for mode in QUANTIZATION_MODES:
+            path, converted = load_or_convert(model, mode, paths, cache_dir)
+            again, reconverted = load_or_convert(model, mode, paths, cache_dir)
+            checks.append((converted and not reconverted and again == path,
+                           f"{mode}: converted once, then reused {os.path.basename(path)}"))
+            backends[f"tflite-{mode}"] = TFLiteClassifier(path)
+        # Two images per call, so a batch size change is exercised too
+        rows = compare_backends(model, backends, images, batch_size=2, repeat=1)
+        dynamic = backends["tflite-dynamic"]
+        for size in (1, 4, 1, 4, 2):
+            dynamic.predict_on_batch(images[:size])
+        checks.append((sorted(dynamic.interpreters) == [1, 2, 4],
+                       f"one interpreter per batch size: {sorted(dynamic.interpreters)}"))
+    print_comparison(rows, len(images))
+    keras_mb = rows[0]["size_mb"]
+    for row in rows[1:]:
+        checks.append((row["top5_agreement"] >= 0.8,
+                       f"{row['backend']}: Keras' top-1 class in its top 5 for "
+                       f"{row['top5_agreement']:.0%} of {len(images)} images"))
+        checks.append((row["size_mb"] < keras_mb / 2,
+                       f"{row['backend']}: {row['size_mb']:.1f} MB against {keras_mb:.1f} MB"))
+    for passed, message in checks:
+        print(f"{'PASS' if passed else 'FAIL'}: {message}")
+    return all(passed for passed, _ in checks)
+
+if __name__ == "__main__":
+    # python tflite_backend.py --test
+    if sys.argv[1:] != ["--test"]:
+        print("Usage: python tflite_backend.py --test")
+        sys.exit(2)
+    if tf is None:
+        print("SKIP: TensorFlow is not installed")
+        sys.exit(0)
+    sys.exit(0 if run_self_test() else 1)
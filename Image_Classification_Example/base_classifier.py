@@ -4,42 +4,18 @@ import cv2
 from tensorflow.keras.applications import MobileNetV2
 from tensorflow.keras.applications.mobilenet_v2 import preprocess_input, decode_predictions
 from tensorflow.keras.preprocessing import image
-from tensorflow.keras.models import Model
+from gradcam import get_gradcam
 
 # Suppress TensorFlow logs
 tf.get_logger().setLevel('ERROR')
 
 # Load model with imagenet weights
 base_model = MobileNetV2(weights="imagenet")
-# Identify the last convolutional layer
-last_conv_layer = base_model.get_layer('Conv_1')
-# Create a model that maps input to both conv outputs and predictions
-grad_model = Model(inputs=base_model.input,
-                   outputs=[last_conv_layer.output, base_model.output])
 
 def make_gradcam_heatmap(img_array, model, last_conv_layer_name, pred_index=None):
-    # Compute gradient model outputs
-    grad_model = Model(
-        inputs=model.inputs,
-        outputs=[model.get_layer(last_conv_layer_name).output, model.output]
-    )
-    # Record operations for automatic differentiation
-    with tf.GradientTape() as tape:
-        conv_outputs, predictions = grad_model(img_array)
-        if pred_index is None:
-            pred_index = tf.argmax(predictions[0])
-        class_channel = predictions[:, pred_index]
-    # Gradient of the predicted class wrt conv outputs
-    grads = tape.gradient(class_channel, conv_outputs)
-    # Compute guided gradients
-    pooled_grads = tf.reduce_mean(grads, axis=(0, 1, 2))
-    # Multiply each channel by corresponding gradients
-    conv_outputs = conv_outputs[0]
-    heatmap = conv_outputs @ pooled_grads[..., tf.newaxis]
-    heatmap = tf.squeeze(heatmap)
-    # ReLU and normalize
-    heatmap = tf.maximum(heatmap, 0) / tf.math.reduce_max(heatmap)
-    return heatmap.numpy()
+    # The gradient model for (model, layer) is built once and reused
+    _, heatmaps = get_gradcam(model, last_conv_layer_name)(img_array, pred_index)
+    return heatmaps[0]
 
 def overlay_heatmap(img_path, heatmap, alpha=0.4, colormap=cv2.COLORMAP_JET):
     # Load original image
@@ -60,12 +36,10 @@ def classify_and_gradcam(image_path, top=3):
     img_array = preprocess_input(img_array)
     img_array = np.expand_dims(img_array, axis=0)
 
-    # Predict
-    preds = base_model.predict(img_array)
+    # Predict and compute the top-1 heatmap from the same forward pass
+    preds, heatmaps = get_gradcam(base_model, 'Conv_1')(img_array)
     decoded = decode_predictions(preds, top=top)[0]
-
-    # Compute heatmap
-    heatmap = make_gradcam_heatmap(img_array, base_model, 'Conv_1')
+    heatmap = heatmaps[0]
     overlay = overlay_heatmap(image_path, heatmap)
 
     # Save or display results
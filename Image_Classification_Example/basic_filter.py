@@ -1,18 +1,21 @@
 from PIL import Image, ImageFilter, ImageDraw
-import matplotlib.pyplot as plt
+from batch_filter import CHECKS, print_batch_report, run_batch, stage
+from image_io import save_image
+from functools import partial
+import argparse
+import hashlib
 import os
 import random
 
+def blur(img):
+    return img.resize((128, 128)).filter(ImageFilter.GaussianBlur(radius=2))
+
 def apply_blur_filter(image_path, output_path="blurred_image.png"):
     try:
         img = Image.open(image_path)
-        img_resized = img.resize((128, 128))
-        img_blurred = img_resized.filter(ImageFilter.GaussianBlur(radius=2))
+        img_blurred = blur(img)
 
-        plt.imshow(img_blurred)
-        plt.axis('off')
-        plt.savefig(output_path, bbox_inches='tight', pad_inches=0)
-        plt.close()
+        save_image(img_blurred, output_path)
         print(f"Processed image saved as '{output_path}'.")
 
     except Exception as e:
@@ -25,40 +28,7 @@ def apply_spaghetti_filter(image_path, output_path="spaghetti_monster.png", nood
     and meatball-like circles.
     """
     try:
-        img = Image.open(image_path).convert('RGBA')
-        img_resized = img.resize((256, 256))
-        overlay = Image.new('RGBA', img_resized.size, (0, 0, 0, 0))
-        draw = ImageDraw.Draw(overlay)
-
-        # Draw noodles
-        for _ in range(noodle_count):
-            # random noodle color (pale yellow/orange)
-            color = (random.randint(200, 255), random.randint(180, 230), random.randint(50, 100), 180)
-            # random start and end points
-            x0, y0 = random.randint(0, 255), random.randint(0, 255)
-            x1, y1 = random.randint(0, 255), random.randint(0, 255)
-            # generate intermediate points for a wiggly noodle
-            points = [(x0, y0)]
-            for t in range(1, 5):
-                xt = x0 + (x1 - x0) * t / 5 + random.randint(-20, 20)
-                yt = y0 + (y1 - y0) * t / 5 + random.randint(-20, 20)
-                points.append((xt, yt))
-            points.append((x1, y1))
-            # draw the noodle
-            draw.line(points, fill=color, width=random.randint(5, 12))
-
-        # Draw meatballs
-        for _ in range(meatball_count):
-            # random position and size
-            cx, cy = random.randint(0, 255), random.randint(0, 255)
-            r = random.randint(10, 25)
-            bbox = [cx - r, cy - r, cx + r, cy + r]
-            # meatball color (brownish)
-            color = (random.randint(80, 120), random.randint(40, 60), random.randint(20, 30), 200)
-            draw.ellipse(bbox, fill=color)
-
-        # Composite overlay
-        combined = Image.alpha_composite(img_resized, overlay).convert('RGB')
+        combined = spaghetti(Image.open(image_path), noodle_count, meatball_count)
         combined.save(output_path)
         print(f"Spaghetti monster image saved as '{output_path}'.")
 
@@ -66,7 +36,94 @@ def apply_spaghetti_filter(image_path, output_path="spaghetti_monster.png", nood
         print(f"Error processing image: {e}")
 
 
+def spaghetti(img, noodle_count=50, meatball_count=10, rng=None):
+    """
+    Return the image resized to 256x256 with spaghetti and meatballs drawn over it.
+
+    Noodles and meatballs are drawn with rng (a random.Random), or with a new
+    generator seeded from the OS when none is given.
+    """
+    rng = rng or random.Random()
+    img = img.convert('RGBA')
+    img_resized = img.resize((256, 256))
+    overlay = Image.new('RGBA', img_resized.size, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(overlay)
+
+    # Draw noodles
+    for _ in range(noodle_count):
+        # random noodle color (pale yellow/orange)
+        color = (rng.randint(200, 255), rng.randint(180, 230), rng.randint(50, 100), 180)
+        # random start and end points
+        x0, y0 = rng.randint(0, 255), rng.randint(0, 255)
+        x1, y1 = rng.randint(0, 255), rng.randint(0, 255)
+        # generate intermediate points for a wiggly noodle
+        points = [(x0, y0)]
+        for t in range(1, 5):
+            xt = x0 + (x1 - x0) * t / 5 + rng.randint(-20, 20)
+            yt = y0 + (y1 - y0) * t / 5 + rng.randint(-20, 20)
+            points.append((xt, yt))
+        points.append((x1, y1))
+        # draw the noodle
+        draw.line(points, fill=color, width=rng.randint(5, 12))
+
+    # Draw meatballs
+    for _ in range(meatball_count):
+        # random position and size
+        cx, cy = rng.randint(0, 255), rng.randint(0, 255)
+        r = rng.randint(10, 25)
+        bbox = [cx - r, cy - r, cx + r, cy + r]
+        # meatball color (brownish)
+        color = (rng.randint(80, 120), rng.randint(40, 60), rng.randint(20, 30), 200)
+        draw.ellipse(bbox, fill=color)
+
+    # Composite overlay
+    return Image.alpha_composite(img_resized, overlay).convert('RGB')
+
+
+# --------- Batch mode ---------
+def seeded_spaghetti(img):
+    """spaghetti() seeded from the image's pixels: the same image always gets the same noodles."""
+    # Forked workers share the parent's random state, and outputs that change
+    # on every run would defeat the up-to-date checks
+    return spaghetti(img, rng=random.Random(hashlib.sha1(img.tobytes()).hexdigest()))
+
+# filter name -> (function, output suffix)
+BATCH_FILTERS = {"blur": (blur, "blurred"), "spaghetti": (seeded_spaghetti, "spaghetti")}
+
+def batch_job(source, outputs, timings, filters):
+    """Batch job for run_batch(): decode once, then filter and encode each output."""
+    with stage(timings, "decode"):
+        img = Image.open(source)
+        img.load()
+    for name in filters:
+        fn, suffix = BATCH_FILTERS[name]
+        with stage(timings, "filter"):
+            result = fn(img)
+        with stage(timings, "encode"):
+            save_image(result, outputs[suffix])
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Filter images, interactively or a directory at a time.")
+    parser.add_argument("--input-dir", help="filter every image under this directory in parallel")
+    parser.add_argument("--filters", default="blur",
+                        help=f"comma-separated: {', '.join(BATCH_FILTERS)}")
+    parser.add_argument("--out-dir", help="output root (default: <input-dir>_filtered)")
+    parser.add_argument("--workers", type=int, help="worker processes (default: CPU count)")
+    parser.add_argument("--check", choices=CHECKS, default="mtime",
+                        help="how to skip images whose outputs are up to date")
+    args = parser.parse_args()
+    if args.input_dir:
+        filters = [f.strip().lower() for f in args.filters.split(",") if f.strip()]
+        unknown = [f for f in filters if f not in BATCH_FILTERS]
+        if unknown or not filters:
+            parser.error(f"Unknown filter(s) {unknown}. Choose from: {', '.join(BATCH_FILTERS)}")
+        report = run_batch(partial(batch_job, filters=filters),
+                           [BATCH_FILTERS[f][1] for f in filters],
+                           args.input_dir, args.out_dir, args.workers, args.check)
+        print_batch_report(report)
+        raise SystemExit(1 if report["failed"] else 0)
+
     print("Image Processor (type 'exit' to quit)\nAvailable filters: blur, spaghetti")
     while True:
         image_path = input("Enter image filename (or 'exit' to quit): ").strip()
@@ -0,0 +1,233 @@
+import contextlib
+import hashlib
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+# --------- Batch settings ---------
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".gif")
+chunk_size = 16  # images per task sent to a worker process
+MANIFEST_FILE = ".filter_manifest.json"  # source hashes, for check="hash"
+CHECKS = ("mtime", "hash", "none")
+
+# --------- Batch processing ---------
+# A job is a top-level function job(source, outputs, timings): it reads the
+# image from source (a path or an in-memory file), writes every path in
+# outputs ({name: path}) and times its stages with stage(). The engine runs
+# jobs over a process pool, skips images whose outputs are up to date and
+# moves outputs into place only once the whole job has succeeded.
+
+@contextlib.contextmanager
+def stage(timings, name):
+    """Add the time spent in the block to timings[name]."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+
+def find_images(input_dir, exclude=None):
+    """Return the image files under input_dir, recursively, sorted."""
+    paths = []
+    exclude = os.path.abspath(exclude) if exclude else None
+    for root, dirs, files in os.walk(input_dir):
+        if exclude:
+            dirs[:] = [d for d in dirs if os.path.abspath(os.path.join(root, d)) != exclude]
+        paths.extend(os.path.join(root, f) for f in files
+                     if f.lower().endswith(IMAGE_EXTENSIONS))
+    return sorted(paths)
+
+def output_paths(rel_path, names, out_dir):
+    """Outputs in the existing naming style: cats/dragon.jpg + bw -> out_dir/cats/dragon_bw.jpg."""
+    base, ext = os.path.splitext(os.path.join(out_dir, rel_path))
+    return {name: f"{base}_{name}{ext or '.png'}" for name in names}
+
+def is_up_to_date(source_path, outputs):
+    """True when every output exists and is at least as new as the source."""
+    try:
+        source_mtime = os.stat(source_path).st_mtime
+        return all(os.stat(p).st_mtime >= source_mtime for p in outputs.values())
+    except OSError:
+        return False
+
+def run_chunk(job, tasks, check):
+    """
+    Worker side: run job over a chunk of images.
+
+    Args:
+        job (callable): See the section comment above.
+        tasks (List[Tuple[str, dict, str | None]]): (source path, outputs,
+            digest recorded for it last time) per image.
+        check (str): One of CHECKS.
+
+    Returns:
+        List[dict]: One result per task with "path", "status" ("done",
+        "skipped" or "failed"), "digest", "error" and stage "timings".
+    """
+    results = []
+    for path, outputs, known_digest in tasks:
+        timings = {}
+        result = dict(path=path, status="done", digest=known_digest, error=None,
+                      timings=timings)
+        results.append(result)
+        try:
+            if check == "mtime" and is_up_to_date(path, outputs):
+                result["status"] = "skipped"
+                continue
+            source = path
+            if check == "hash":
+                # Hash the bytes once and decode from the same buffer
+                with stage(timings, "read"):
+                    with open(path, "rb") as f:
+                        data = f.read()
+                    digest = hashlib.sha1(data)
+                    digest.update("\0".join(sorted(outputs)).encode())
+                    result["digest"] = digest.hexdigest()
+                if (result["digest"] == known_digest
+                        and all(os.path.exists(p) for p in outputs.values())):
+                    result["status"] = "skipped"
+                    continue
+                source = io.BytesIO(data)
+            # Write to temporary names and rename at the end, so an
+            # interrupted job never leaves a truncated output that looks
+            # up to date
+            partial = {}
+            for name, out in outputs.items():
+                root, ext = os.path.splitext(out)
+                partial[name] = f"{root}.part-{os.getpid()}{ext}"
+                os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+            try:
+                job(source, partial, timings)
+                for name, out in outputs.items():
+                    os.replace(partial[name], out)
+            finally:
+                for tmp in partial.values():
+                    if os.path.exists(tmp):
+                        os.remove(tmp)
+        except Exception as e:
+            result.update(status="failed", error=f"{type(e).__name__}: {e}")
+    return results
+
+def load_manifest(out_dir):
+    try:
+        with open(os.path.join(out_dir, MANIFEST_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(out_dir, manifest):
+    path = os.path.join(out_dir, MANIFEST_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=0, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+def run_batch(job, names, input_dir, out_dir=None, workers=None, check="mtime",
+              chunk=None, verbose=True):
+    """
+    Run a filter job over every image under a directory in a process pool.
+
+    Images are sent to workers in chunks, with at most two chunks per worker
+    in flight, so thousands of files never become thousands of pending tasks.
+
+    Args:
+        job (callable): Top-level job function (or functools.partial of one).
+        names (List[str]): Output names written per image, e.g. ["bw", "sepia"].
+        input_dir (str): Directory searched recursively for images.
+        out_dir (str | None): Output root mirroring input_dir; defaults to
+            "<input_dir>_filtered". It may lie inside input_dir, but must not
+            be input_dir itself.
+        workers (int | None): Worker processes; defaults to the CPU count.
+        check (str): How to skip up-to-date images: "mtime" (outputs newer
+            than the source), "hash" (source content unchanged since the
+            last run, per the manifest in out_dir) or "none".
+        chunk (int | None): Images per task; defaults to chunk_size.
+        verbose (bool): Print progress after every chunk.
+
+    Returns:
+        dict: "images", "done", "skipped", "failed" (a list of (path,
+        error)), "wall_s", "images_per_sec" (images written) and per-stage
+        totals in "stages" ({name: {"total_s", "ms_per_image"}}), averaged
+        over the images that ran each stage.
+    """
+    if check not in CHECKS:
+        raise ValueError(f"Unknown check '{check}'. Choose from: {', '.join(CHECKS)}")
+    out_dir = out_dir or os.path.normpath(input_dir) + "_filtered"
+    if os.path.realpath(out_dir) == os.path.realpath(input_dir):
+        # Outputs would be found as inputs on the next run and filtered again
+        raise ValueError("out_dir must differ from input_dir; use a subdirectory or "
+                         "the default '<input_dir>_filtered'.")
+    workers = workers or os.cpu_count() or 1
+    chunk = chunk or chunk_size
+    os.makedirs(out_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    paths = find_images(input_dir, exclude=out_dir)
+    manifest = load_manifest(out_dir) if check == "hash" else {}
+    tasks = []
+    for path in paths:
+        rel = os.path.relpath(path, input_dir)
+        tasks.append((path, output_paths(rel, names, out_dir), manifest.get(rel)))
+    chunks = [tasks[i:i + chunk] for i in range(0, len(tasks), chunk)]
+
+    counts = {"done": 0, "skipped": 0}
+    failed = []
+    stages = {}
+    finished = 0
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = set()
+            next_chunk = 0
+            while next_chunk < len(chunks) or pending:
+                while next_chunk < len(chunks) and len(pending) < 2 * workers:
+                    pending.add(pool.submit(run_chunk, job, chunks[next_chunk], check))
+                    next_chunk += 1
+                completed, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in completed:
+                    for result in future.result():
+                        finished += 1
+                        if result["status"] == "failed":
+                            failed.append((result["path"], result["error"]))
+                        else:
+                            counts[result["status"]] += 1
+                            if result["digest"]:
+                                manifest[os.path.relpath(result["path"], input_dir)] = result["digest"]
+                        for name, seconds in result["timings"].items():
+                            total, count = stages.get(name, (0.0, 0))
+                            stages[name] = (total + seconds, count + 1)
+                if verbose:
+                    elapsed = time.perf_counter() - start
+                    print(f"[{finished}/{len(tasks)}] {counts['done']} written, "
+                          f"{counts['skipped']} up to date, {len(failed)} failed "
+                          f"({finished / elapsed:.1f} images/s)", file=sys.stderr)
+    finally:
+        # Keep what finished, even when interrupted
+        if check == "hash":
+            save_manifest(out_dir, manifest)
+
+    wall = time.perf_counter() - start
+    return {
+        "images": len(tasks),
+        "done": counts["done"],
+        "skipped": counts["skipped"],
+        "failed": failed,
+        "wall_s": wall,
+        "images_per_sec": counts["done"] / wall if wall else 0.0,
+        "stages": {name: {"total_s": total, "ms_per_image": total * 1000 / count}
+                   for name, (total, count) in stages.items()},
+        "workers": workers,
+        "out_dir": out_dir,
+    }
+
+def print_batch_report(report):
+    """Print a run_batch() report; per-stage times are summed over all workers."""
+    print(f"{report['images']} images with {report['workers']} workers in "
+          f"{report['wall_s']:.2f} s: {report['done']} written "
+          f"({report['images_per_sec']:.1f} images/s), {report['skipped']} up to date, "
+          f"{len(report['failed'])} failed. Outputs in '{report['out_dir']}'.")
+    for name, stats in report["stages"].items():
+        print(f"  {name:<8} {stats['total_s']:8.2f} s  {stats['ms_per_image']:7.2f} ms/image")
+    for path, error in report["failed"]:
+        print(f"  failed: {path}: {error}")
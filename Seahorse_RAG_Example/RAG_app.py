@@ -1,89 +1,450 @@
+import argparse
+import ast
 import logging
-from transformers import logging as transformers_logging
 import warnings
 from dotenv import load_dotenv  # Make sure this is imported
 import os
-import openai
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from sentence_transformers import SentenceTransformer
-import numpy as np
-import faiss
+import subprocess
+import sys
+import threading
+import time
+import asyncio
+
+# Heavy dependencies (transformers, langchain, sentence_transformers, faiss)
+# are imported by RAGEngine on first use, so importing this module, printing
+# --help or testing build_messages() stays fast.
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Set log levels
-transformers_logging.get_logger("langchain.text_splitter").setLevel(logging.ERROR)
-transformers_logging.set_verbosity_error()
-warnings.filterwarnings("ignore")
-
-# Retrieve OpenAI API key from environment
-api_key = os.getenv("OPENAI_API_KEY")
-if not api_key:
-    raise ValueError("OpenAI API key not found. Make sure your .env file has OPENAI_API_KEY set.")
-
-openai.api_key = api_key
-
-# Read contents of Selected_Document.txt into text variable
-with open("Selected_Document.txt", "r", encoding="utf-8") as file:
-    text = file.read()
+# Chat backend: "openai", or "local" for the deterministic offline stand-in.
+# OPENAI_BASE_URL can point the openai backend at another server, such as the
+# stand-in started by `python llm_client.py`.
+llm_backend = os.getenv("RAG_LLM_BACKEND", "openai")
+base_url = os.getenv("OPENAI_BASE_URL")
 
 # Define variables
 chunk_size = 500
 chunk_overlap = 100
 model_name = "sentence-transformers/all-distilroberta-v1"
 top_k = 5
+index_dir = ".rag_index"  # where the chunks, embeddings and FAISS index are cached
+corpus_path = "Selected_Document.txt"  # a single document or a directory of documents
+corpus_pattern = "*.txt"  # which files to ingest when corpus_path is a directory
+batch_size = 64  # chunks encoded and added to the index at a time
 
-# Split text into chunks using RecursiveCharacterTextSplitter
-text_splitter = RecursiveCharacterTextSplitter(
-    separators=["\n\n", "\n", " ", ""],
-    chunk_size=chunk_size,
-    chunk_overlap=chunk_overlap,
+# Search backend: "flat" (exact), or approximate "ivf_flat", "ivf_pq" or "hnsw".
+# Approximate indexes are trained on the stored embeddings the first time they
+# are used; run `python RAG_app.py --ann-report` to compare recall and latency.
+index_type = "flat"
+ann_params = dict(
+    nlist=None,  # IVF cells; None picks about 4 * sqrt(number of chunks)
+    pq_m=16,  # PQ sub-quantizers for ivf_pq (must divide the embedding dimension)
+    pq_nbits=8,  # bits per PQ code for ivf_pq
+    hnsw_m=32,  # neighbours per node for hnsw
 )
+nprobe = 8  # IVF cells visited per query
+ef_search = 64  # HNSW candidate list size per query
+
+# How the searched vectors are held in memory: "float32", "float16", "int8"
+# (scalar quantized) or "pq" (product quantized, using pq_m and pq_nbits).
+# Lossy storage is searched for rerank_candidates chunks, which are re-ranked
+# by exact distance using their float32 rows from the memory-mapped embeddings
+# on disk. Run `python RAG_app.py --storage-report` to compare memory and recall.
+embedding_storage = "float32"
+rerank_candidates = 50
+
+# Retrieval: "dense" (FAISS only), "sparse" (BM25 only) or "hybrid" (both,
+# merged with reciprocal-rank fusion). In hybrid mode a question skips the
+# transformer entirely when its best BM25 score beats the runner-up by
+# bm25_decisive_ratio and reaches bm25_decisive_min_score.
+retrieval_mode = "dense"
+bm25_decisive_ratio = 2.0
+bm25_decisive_min_score = 4.0  # a single rare term matched once scores about 3
+rrf_candidates = 20  # chunks taken from each retriever before fusion
+rrf_k = 60  # reciprocal-rank fusion damping constant
+llm_concurrency = 8  # Chat Completions requests in flight at once
+llm_timeout = 30.0  # seconds allowed per Chat Completions attempt
+llm_max_retries = 3  # retries for timeouts, connection errors and rate limits
+chat_model = "gpt-3.5-turbo"
+
+# Context assembly: overlapping and adjacent chunks are merged back into
+# contiguous passages, near-duplicates are dropped, and the result is packed
+# best-first into this many tokens
+context_token_budget = 1500
+near_duplicate_threshold = 0.8  # share of a passage's word shingles already included
+stream_answers = True  # print answers token by token in the REPL
+
+# Caches: an in-memory LRU of question embeddings, and answers persisted in
+# SQLite keyed by question, retrieved chunk ids, model and prompt
+embedding_cache_size = 1024
+answer_cache_path = os.path.join(index_dir, "answers.sqlite")
+answer_cache_ttl = 7 * 24 * 3600  # seconds before a cached answer expires
+answer_cache_max_entries = 10000
+
+# Modules that must not be loaded by a plain `import RAG_app`, and how long
+# that import may take; both are checked by `python RAG_app.py --test`
+HEAVY_MODULES = ("transformers", "langchain", "sentence_transformers", "faiss", "torch")
+import_time_budget = 0.5  # seconds
+
+
+class RAGEngine:
+    """
+    The embedding model, index, caches and LLM client behind the RAG functions.
+
+    Creating one loads the model and loads or updates the index, which takes
+    seconds; use get_engine() to share a single instance created on first use.
+    """
+    def __init__(self):
+        from transformers import logging as transformers_logging
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+        from sentence_transformers import SentenceTransformer
+        from index_store import index_key, load_index, update_index
+        from ingest import corpus_fingerprint, iter_chunks, list_documents
+        from rag_cache import AnswerCache, EmbeddingCache
+        from ann_index import factory_string, is_lossy, load_or_build_ann_index, set_search_params
+        from bm25 import load_or_build_bm25
+        from llm_client import AsyncLLMClient, make_backend
+
+        # Set log levels
+        transformers_logging.get_logger("langchain.text_splitter").setLevel(logging.ERROR)
+        transformers_logging.set_verbosity_error()
+        warnings.filterwarnings("ignore")
+
+        # Retrieve OpenAI API key from environment
+        api_key = os.getenv("OPENAI_API_KEY")
+        if llm_backend == "openai" and not api_key:
+            if not base_url:
+                raise ValueError("OpenAI API key not found. Make sure your .env file has OPENAI_API_KEY set.")
+            api_key = "not-needed"
+
+        self.embedding_cache = EmbeddingCache(embedding_cache_size)
+        self.answer_cache = AnswerCache(answer_cache_path, answer_cache_ttl,
+                                        answer_cache_max_entries)
+
+        # One long-lived client: reuses connections across questions and caps concurrency
+        self.llm_client = AsyncLLMClient(
+            make_backend(llm_backend, api_key=api_key, base_url=base_url),
+            chat_model,
+            max_concurrency=llm_concurrency,
+            timeout=llm_timeout,
+            max_retries=llm_max_retries,
+        )
+
+        # Load model used to encode chunks and questions
+        self.embedder = SentenceTransformer(model_name)
+
+        # Reuse the chunks, embeddings and FAISS index saved by a previous run. When the
+        # corpus has changed, the documents are streamed through the splitter and the
+        # encoder in batches; only new or modified chunks are re-encoded and vectors
+        # for chunks that no longer exist are removed from the index
+        index_start = time.perf_counter()
+        self.key = index_key(chunk_size, chunk_overlap, model_name)
+        documents = list_documents(corpus_path, corpus_pattern)
+        fingerprint = corpus_fingerprint(documents)
+        # With compressed storage the flat index is only needed for updates, so it is
+        # memory-mapped instead of read into memory
+        compressed = embedding_storage != "float32"
+        stored = load_index(index_dir, self.key, mmap=compressed)
+        if stored is None or stored.meta.get("corpus_fingerprint") != fingerprint:
+            # Split text into chunks using RecursiveCharacterTextSplitter
+            text_splitter = RecursiveCharacterTextSplitter(
+                separators=["\n\n", "\n", " ", ""],
+                chunk_size=chunk_size,
+                chunk_overlap=chunk_overlap,
+                # Chunk offsets for provenance come from the splitter itself
+                add_start_index=True,
+            )
+
+            stored, added, removed = update_index(
+                index_dir,
+                self.key,
+                stored,
+                iter_chunks(documents, text_splitter),
+                lambda new_chunks: self.embedder.encode(new_chunks, show_progress_bar=False),
+                self.embedder.get_sentence_embedding_dimension(),
+                batch_size=batch_size,
+                mmap=compressed,
+                corpus_fingerprint=fingerprint,
+                chunk_size=chunk_size,
+                chunk_overlap=chunk_overlap,
+                model_name=model_name,
+            )
+            print(f"Index updated from {len(documents)} documents: "
+                  f"{added} chunks encoded, {removed} removed.")
+
+        # chunks holds one dict per indexed chunk: its "text" plus the "source" document
+        # and the "start"/"end" character offsets it came from
+        self.chunks, self.chunk_ids, self.embeddings, self.faiss_index = stored[:4]
+        # Indexes derived from these chunks are stored with them, per generation
+        self.store_path = stored.path
+        # Map FAISS ids back to positions in chunks
+        self.id_to_pos = {int(i): pos for pos, i in enumerate(self.chunk_ids)}
+
+        # Search the approximate index when one is configured and the corpus is large
+        # enough to train it; the exact flat index is used otherwise
+        self.search_index = load_or_build_ann_index(
+            self.store_path, self.embeddings, self.chunk_ids,
+            index_type, storage=embedding_storage, **ann_params)
+        if self.search_index is None:
+            self.search_index = self.faiss_index
+        set_search_params(self.search_index, nprobe=nprobe, ef_search=ef_search)
+        # Re-rank by exact distance when the searched index only approximates it
+        self.rerank = rerank_candidates > 0 and is_lossy(factory_string(
+            index_type, len(self.chunk_ids), self.embeddings.shape[1],
+            storage=embedding_storage, **ann_params))
+
+        # Sparse keyword index over the same chunks, for sparse and hybrid retrieval
+        self.bm25 = None
+        self.sparse_fast_path = 0
+        if retrieval_mode != "dense":
+            self.bm25 = load_or_build_bm25(self.store_path,
+                                           [c["text"] for c in self.chunks])
+        # Seconds spent loading or building the indexes, without the model load
+        self.index_seconds = time.perf_counter() - index_start
+
+    def encode_questions(self, questions):
+        """
+        Encode questions in one batch, skipping those already in the embedding cache.
+
+        Args:
+            questions (List[str]): The input question strings.
+
+        Returns:
+            np.ndarray: float32 array with one row per question.
+        """
+        import numpy as np
+
+        vectors = [self.embedding_cache.get(q) for q in questions]
+        missing = list(dict.fromkeys(q for q, v in zip(questions, vectors) if v is None))
+        if missing:
+            encoded = self.embedder.encode(missing, batch_size=batch_size,
+                                           show_progress_bar=False)
+            new_vectors = dict(zip(missing, np.array(encoded).astype('float32')))
+            for q, v in new_vectors.items():
+                self.embedding_cache.put(q, v)
+            vectors = [new_vectors[q] if v is None else v for q, v in zip(questions, vectors)]
+        return np.stack(vectors)
+
+    def dense_search(self, questions, k: int = top_k):
+        """
+        Encode all questions in one batch and search the FAISS index with a single call.
 
-chunks = text_splitter.split_text(text)
+        With lossy embedding_storage the top rerank_candidates are re-ranked
+        by their exact float32 distance.
 
-# Load model and encode chunks
-embedder = SentenceTransformer(model_name)
-embeddings = embedder.encode(chunks, show_progress_bar=False)
-embeddings = np.array(embeddings).astype('float32')
+        Args:
+            questions (List[str]): The input question strings.
+            k (int): Number of nearest chunks to retrieve per question (default: top_k).
 
-# Initialize FAISS index and add embeddings
-dimension = embeddings.shape[1]
-faiss_index = faiss.IndexFlatL2(dimension)
-faiss_index.add(embeddings)
+        Returns:
+            List[List[int]]: Chunk ids for each question, best match first.
+        """
+        from ann_index import rerank
+
+        if not questions:
+            return []
+        queries = self.encode_questions(list(questions))
+        if self.rerank:
+            _, candidates = self.search_index.search(queries, max(k, rerank_candidates))
+            return rerank(queries, candidates, self.embeddings, self.id_to_pos, k)
+        distances, I = self.search_index.search(queries, k)
+        # FAISS pads with -1 when the index holds fewer than k vectors
+        return [[int(i) for i in row if i != -1] for row in I]
+
+    def search_chunk_ids(self, questions, k: int = top_k):
+        """
+        Find the top k chunks for each question using the configured retrieval_mode.
+
+        In "hybrid" mode, questions whose BM25 ranking is decisive are answered
+        from the sparse index alone; the rest are encoded together in one batch
+        and their dense and sparse rankings are merged with reciprocal-rank fusion.
+
+        Args:
+            questions (List[str]): The input question strings.
+            k (int): Number of chunks to retrieve per question (default: top_k).
+
+        Returns:
+            List[List[int]]: Chunk ids for each question, best match first.
+        """
+        from bm25 import is_decisive, reciprocal_rank_fusion
+
+        if retrieval_mode == "dense":
+            return self.dense_search(questions, k)
+
+        depth = max(k, rrf_candidates)
+        sparse = []
+        for question in questions:
+            positions, scores = self.bm25.search(question, depth)
+            sparse.append(([int(self.chunk_ids[p]) for p in positions], scores))
+        if retrieval_mode == "sparse":
+            return [ids[:k] for ids, _ in sparse]
+
+        results = [None] * len(questions)
+        need_dense = []
+        for n, (ids, scores) in enumerate(sparse):
+            if is_decisive(scores, bm25_decisive_ratio, bm25_decisive_min_score):
+                # Fast path: the keyword match is clear enough to skip the transformer
+                results[n] = ids[:k]
+                self.sparse_fast_path += 1
+            else:
+                need_dense.append(n)
+        dense = self.dense_search([questions[n] for n in need_dense], depth)
+        for n, dense_ids in zip(need_dense, dense):
+            results[n] = reciprocal_rank_fusion([dense_ids, sparse[n][0]], k, rrf_k)
+        return results
+
+    def chunk_records(self, ids):
+        """Return the chunk records for a list of chunk ids."""
+        return [self.chunks[self.id_to_pos[i]] for i in ids]
+
+    def messages_for(self, question: str, ids):
+        """Build the chat messages and answer cache key for a question and its chunk ids."""
+        from context_builder import build_context
+        from rag_cache import AnswerCache
+
+        passages = build_context(self.chunk_records(ids), context_token_budget,
+                                 near_duplicate_threshold)
+        messages = build_messages(question, passages)
+        cache_key = AnswerCache.make_key(question, ids, f"{llm_backend}:{chat_model}", messages)
+        return messages, cache_key
+
+    async def answer_from_chunks_async(self, question: str, ids) -> str:
+        """
+        Answer a question from already retrieved chunks, using the answer cache.
+
+        Args:
+            question (str): The input question string.
+            ids (List[int]): Ids of the retrieved chunks, best match first.
+
+        Returns:
+            str: The assistant's answer based on the retrieved context.
+        """
+        messages, cache_key = self.messages_for(question, ids)
+        answer = self.answer_cache.get(cache_key)
+        if answer is None:
+            answer = await self.llm_client.complete_async(messages)
+            self.answer_cache.put(cache_key, answer)
+        return answer
+
+    async def stream_answer_from_chunks(self, question: str, ids):
+        """
+        Yield the answer to a question from already retrieved chunks as it is generated.
+
+        Cached answers are yielded in one piece; otherwise the full answer is
+        cached once the stream completes. Runs on the LLM client's loop.
+
+        Args:
+            question (str): The input question string.
+            ids (List[int]): Ids of the retrieved chunks, best match first.
+
+        Yields:
+            str: Pieces of the answer, roughly one token each.
+        """
+        messages, cache_key = self.messages_for(question, ids)
+        answer = self.answer_cache.get(cache_key)
+        if answer is not None:
+            yield answer
+            return
+        pieces = []
+        async for piece in self.llm_client.stream(messages):
+            pieces.append(piece)
+            yield piece
+        self.answer_cache.put(cache_key, "".join(pieces).strip())
+
+    def cache_stats(self) -> dict:
+        """Return hit/miss counters for the embedding and answer caches."""
+        return {"embeddings": self.embedding_cache.stats(), "answers": self.answer_cache.stats(),
+                "sparse_fast_path": self.sparse_fast_path}
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+# Function to get the shared engine, creating it on first use
+def get_engine() -> RAGEngine:
+    """Return the shared RAGEngine, creating it on first use (thread-safe)."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = RAGEngine()
+    return _engine
+
+# Function to start loading the engine without waiting for it
+def prewarm() -> threading.Thread:
+    """
+    Create the shared engine in a background thread.
+
+    Errors are left for the next get_engine() call to raise in the foreground.
+
+    Returns:
+        threading.Thread: The (daemon) thread doing the work.
+    """
+    def warm():
+        try:
+            get_engine()
+        except Exception:
+            pass
+
+    thread = threading.Thread(target=warm, name="rag-prewarm", daemon=True)
+    thread.start()
+    return thread
 
 # Function to retrieve top k chunks for a question
-def retrieve_chunks(question: str, k: int = top_k):
+def retrieve_chunks(question: str, k: int = top_k, with_sources: bool = False):
     """
     Encode the question and search the FAISS index for top k similar chunks.
 
     Args:
         question (str): The input question string.
         k (int): Number of nearest chunks to retrieve (default: top_k).
+        with_sources (bool): Return the full chunk records instead of just their text.
 
     Returns:
-        List[str]: List of relevant text chunks.
+        List[str] | List[dict]: List of relevant text chunks, or, with
+        with_sources, dicts with "text", "source", "start" and "end".
     """
-    q_vec = embedder.encode([question], show_progress_bar=False)
-    q_arr = np.array(q_vec).astype('float32')
-    distances, I = faiss_index.search(q_arr, k)
-    return [chunks[i] for i in I[0]]
+    return retrieve_chunks_batch([question], k, with_sources)[0]
 
-# Function to answer a question based on retrieved context chunks
-def answer_question(question: str) -> str:
+# Function to find the ids of the top k chunks for many questions at once
+def search_chunk_ids(questions, k: int = top_k):
+    """Return the ids of the top k chunks for each question; see RAGEngine.search_chunk_ids()."""
+    return get_engine().search_chunk_ids(questions, k)
+
+# Function to retrieve top k chunks for many questions at once
+def retrieve_chunks_batch(questions, k: int = top_k, with_sources: bool = False):
     """
-    Retrieves relevant chunks and uses OpenAI's Chat Completions API to answer the question.
+    Retrieve the top k chunks for several questions with one encode and one search.
 
     Args:
-        question (str): The input question string.
+        questions (List[str]): The input question strings.
+        k (int): Number of nearest chunks to retrieve per question (default: top_k).
+        with_sources (bool): Return the full chunk records instead of just their text.
 
     Returns:
-        str: The assistant's answer based on the retrieved context.
+        List[List[str]] | List[List[dict]]: The retrieve_chunks() result for
+        each question, in the same order as questions.
     """
-    # Retrieve relevant chunks
-    relevant_chunks = retrieve_chunks(question)
+    engine = get_engine()
+    results = []
+    for ids in engine.search_chunk_ids(questions, k):
+        hits = engine.chunk_records(ids)
+        results.append(hits if with_sources else [hit["text"] for hit in hits])
+    return results
+
+# Function to build the chat messages for a question and its context chunks
+def build_messages(question: str, relevant_chunks):
+    """
+    Build the system and user messages sent to the Chat Completions API.
+
+    Args:
+        question (str): The input question string.
+        relevant_chunks (List[str]): Retrieved context chunks.
 
+    Returns:
+        List[dict]: Chat messages with "role" and "content".
+    """
     # Combine chunks into a single context string separated by double newlines
     context = "\n\n".join(relevant_chunks)
 
@@ -101,26 +462,188 @@ Question: {question}
 
 Answer:
 """
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt},
+    ]
 
-    # Call OpenAI Chat Completions with the prompts and parameters
-    resp = openai.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt},
-        ],
-        temperature=0.0,
-        max_tokens=500,
-    )
+# Function to answer a question based on retrieved context chunks
+async def answer_question_async(question: str) -> str:
+    """
+    Retrieves relevant chunks and asks the chat backend to answer the question.
+
+    Engine creation and retrieval run in a worker thread so the event loop
+    stays responsive.
+
+    Args:
+        question (str): The input question string.
+
+    Returns:
+        str: The assistant's answer based on the retrieved context.
+    """
+    engine = await asyncio.to_thread(get_engine)
+    ids = (await asyncio.to_thread(engine.search_chunk_ids, [question]))[0]
+    return await engine.answer_from_chunks_async(question, ids)
+
+def answer_question(question: str, stream: bool = False):
+    """
+    Retrieves relevant chunks and asks the chat backend to answer the question.
+
+    Args:
+        question (str): The input question string.
+        stream (bool): Return an iterator over the answer's tokens as they
+            arrive instead of waiting for the whole answer.
+
+    Returns:
+        str | Iterator[str]: The assistant's answer based on the retrieved
+        context, or, with stream, its tokens.
+    """
+    engine = get_engine()
+    # Retrieve relevant chunks
+    ids = engine.search_chunk_ids([question])[0]
+    if stream:
+        return engine.llm_client.iterate(engine.stream_answer_from_chunks(question, ids))
+    return engine.llm_client.run(engine.answer_from_chunks_async(question, ids))
+
+# Function to print a streamed answer with its timing
+def print_streamed_answer(question: str):
+    """Print the answer's tokens as they arrive, then time-to-first-token and tokens/sec."""
+    start = time.perf_counter()
+    first = None
+    count = 0
+    print("Answer: ", end="", flush=True)
+    for token in answer_question(question, stream=True):
+        if first is None:
+            first = time.perf_counter()
+            token = token.lstrip()
+        count += 1
+        print(token, end="", flush=True)
+    end = time.perf_counter()
+    if first is None:
+        print(f"\n[no tokens received in {end - start:.2f}s]")
+        return
+    report = f"time to first token {first - start:.2f}s, {count} tokens"
+    if count > 1 and end > first:
+        # Rate over the tokens that followed the first one
+        report += f", {(count - 1) / (end - first):.1f} tokens/s"
+    print(f"\n[{report}]")
+
+# Function to answer many questions, e.g. for offline evaluations
+async def answer_questions_async(questions, max_concurrency: int = llm_concurrency):
+    """
+    Answer a list of questions with one batched retrieval and concurrent model calls.
+
+    Args:
+        questions (List[str]): The input question strings.
+        max_concurrency (int): Maximum number of these questions being answered
+            at once; the client's own llm_concurrency limit also applies.
+
+    Returns:
+        List[str]: The answers, in the same order as questions.
+    """
+    engine = await asyncio.to_thread(get_engine)
+    all_ids = await asyncio.to_thread(engine.search_chunk_ids, questions)
+    limit = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def answer_one(question, ids):
+        async with limit:
+            return await engine.answer_from_chunks_async(question, ids)
 
-    # Return the assistant's reply text, stripped of whitespace
-    return resp.choices[0].message.content.strip()
+    return await asyncio.gather(*(answer_one(q, ids) for q, ids in zip(questions, all_ids)))
+
+def answer_questions(questions, max_concurrency: int = llm_concurrency):
+    """Blocking answer_questions_async() for synchronous callers."""
+    return get_engine().llm_client.run(answer_questions_async(questions, max_concurrency))
+
+# Function to report cache effectiveness
+def cache_stats() -> dict:
+    """Return hit/miss counters for the caches and how often dense retrieval was skipped."""
+    return get_engine().cache_stats()
+
+# Function to check that importing this module stays cheap
+def run_self_test() -> bool:
+    """
+    Import this module in a fresh interpreter and check the import-time budget.
+
+    Also checks that no heavy module was loaded by the import and that
+    build_messages() works without creating the engine.
+
+    Returns:
+        bool: True if every check passed.
+    """
+    code = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        "import RAG_app\n"
+        "elapsed = time.perf_counter() - start\n"
+        "RAG_app.build_messages('q', ['a', 'b'])\n"
+        "loaded = [m for m in RAG_app.HEAVY_MODULES if m in sys.modules]\n"
+        "print(repr((elapsed, loaded)))\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    if result.returncode != 0:
+        print("FAIL: import RAG_app raised an error\n" + result.stderr)
+        return False
+    elapsed, loaded = ast.literal_eval(result.stdout.strip().splitlines()[-1])
+    passed = True
+    if elapsed <= import_time_budget:
+        print(f"PASS: import took {elapsed:.3f}s (budget {import_time_budget}s)")
+    else:
+        print(f"FAIL: import took {elapsed:.3f}s (budget {import_time_budget}s)")
+        passed = False
+    if loaded:
+        print(f"FAIL: import loaded heavy modules: {', '.join(loaded)}")
+        passed = False
+    else:
+        print("PASS: no heavy modules loaded by import or build_messages()")
+    return passed
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Answer questions about the corpus with RAG.")
+    parser.add_argument("--ann-report", action="store_true",
+                        help="compare recall and latency of the approximate index types")
+    parser.add_argument("--storage-report", action="store_true",
+                        help="compare memory and recall of the embedding storage types")
+    parser.add_argument("--no-stream", action="store_true",
+                        help="print each answer once it is complete")
+    parser.add_argument("--test", action="store_true",
+                        help="check the import-time budget and exit")
+    args = parser.parse_args()
+
+    if args.test:
+        sys.exit(0 if run_self_test() else 1)
+
+    if args.ann_report:
+        from ann_index import print_recall_report, recall_report
+        engine = get_engine()
+        print_recall_report(recall_report(engine.embeddings, engine.chunk_ids, k=top_k,
+                                          storage=embedding_storage, **ann_params))
+        sys.exit(0)
+
+    if args.storage_report:
+        from ann_index import print_storage_report, storage_report
+        engine = get_engine()
+        print_storage_report(storage_report(engine.embeddings, engine.chunk_ids, k=top_k,
+                                            rerank_candidates=rerank_candidates,
+                                            pq_m=ann_params["pq_m"],
+                                            pq_nbits=ann_params["pq_nbits"]))
+        sys.exit(0)
+
+    if args.no_stream:
+        stream_answers = False
+
+    # Load the model and index in the background while the first question is typed
+    prewarm()
     print("Enter 'exit' or 'quit' to end.")
     while True:
         question = input("Your question: ")
         if question.lower() in ("exit", "quit"):
             break
-        print("Answer:", answer_question(question))
+        if stream_answers:
+            print_streamed_answer(question)
+        else:
+            print("Answer:", answer_question(question))
+    if _engine is not None:
+        print("Cache stats:", cache_stats())
@@ -0,0 +1,351 @@
+import json
+import math
+import os
+import time
+
+import numpy as np
+import faiss
+
+from index_store import content_hash
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+
+# How the vectors inside an index are stored: full float32, half precision,
+# 8-bit scalar quantization (one byte per dimension) or product quantization
+# (pq_m codes of pq_nbits bits per vector)
+STORAGE_TYPES = ("float32", "float16", "int8", "pq")
+
+
+def storage_codec(storage: str, count: int, dimension: int, pq_m: int = 16,
+                  pq_nbits: int = 8):
+    """
+    Return the FAISS encoding for a storage type, e.g. "SQ8".
+
+    Returns:
+        str | None: The encoding, "Flat" for float32, or None when pq_m does
+        not divide dimension. PQ falls back to "SQ8" until there are enough
+        vectors to train its codebooks (see pq_trainable()).
+    """
+    if storage not in STORAGE_TYPES:
+        raise ValueError(f"Unknown embedding storage '{storage}'. "
+                         f"Choose from: {', '.join(STORAGE_TYPES)}")
+    if storage == "pq":
+        if dimension % pq_m:
+            return None
+        return f"PQ{pq_m}x{pq_nbits}" if pq_trainable(count, pq_nbits) else "SQ8"
+    return {"float32": "Flat", "float16": "SQfp16", "int8": "SQ8"}[storage]
+
+
+def pq_trainable(count: int, pq_nbits: int = 8) -> bool:
+    """True when count vectors are enough to train PQ codebooks of 2 ** pq_nbits centroids.
+
+    FAISS wants about 39 training points per centroid; with fewer, k-means
+    leaves centroids poorly placed and recall drops well below SQ8's.
+    """
+    return count >= 39 * 2 ** pq_nbits
+
+
+def factory_string(index_type: str, count: int, dimension: int, nlist=None,
+                   pq_m: int = 16, pq_nbits: int = 8, hnsw_m: int = 32,
+                   storage: str = "float32"):
+    """
+    Translate an index_type and its parameters into a FAISS index_factory string.
+
+    Args:
+        index_type (str): One of INDEX_TYPES.
+        count (int): Number of vectors the index will be trained on.
+        dimension (int): Embedding dimension.
+        nlist (int | None): Number of IVF cells; defaults to about 4 * sqrt(count).
+        pq_m (int): Number of PQ sub-quantizers for ivf_pq and pq storage
+            (must divide dimension).
+        pq_nbits (int): Bits per PQ code for ivf_pq and pq storage.
+        hnsw_m (int): Neighbours per node for hnsw.
+        storage (str): One of STORAGE_TYPES, for the flat, ivf_flat and hnsw
+            index types; ivf_pq stores PQ codes (SQ8 until pq_trainable()).
+
+    Returns:
+        str | None: The factory string, or None when the corpus is too small to
+        train the requested index (callers then fall back to the flat index).
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}'. "
+                         f"Choose from: {', '.join(INDEX_TYPES)}")
+    codec = storage_codec(storage, count, dimension, pq_m, pq_nbits)
+    if codec is None:
+        return None
+    if index_type == "flat":
+        return None if codec == "Flat" else codec
+    if index_type == "hnsw":
+        return f"HNSW{hnsw_m}" if codec == "Flat" else f"HNSW{hnsw_m}_{codec}"
+
+    if nlist is None:
+        # Keep roughly 39+ training points per cell, as FAISS recommends
+        nlist = min(int(4 * math.sqrt(count)), count // 39)
+    if nlist < 1 or count < nlist:
+        return None
+    if index_type == "ivf_flat":
+        return f"IVF{nlist},{codec}"
+    if dimension % pq_m:
+        return None
+    if not pq_trainable(count, pq_nbits):
+        return f"IVF{nlist},SQ8"
+    return f"IVF{nlist},PQ{pq_m}x{pq_nbits}"
+
+
+def is_lossy(factory) -> bool:
+    """True when an index built from factory returns approximate distances."""
+    return factory is not None and ("PQ" in factory or "SQ" in factory)
+
+
+def rerank(queries, candidates, embeddings, id_to_pos, k: int):
+    """
+    Re-rank candidate chunks by their exact float32 distance to each query.
+
+    Only the candidates' rows are read from embeddings, so with memory-mapped
+    embeddings the full-precision vectors never have to be held in memory.
+
+    Args:
+        queries (np.ndarray): float32 query vectors, one row per query.
+        candidates (np.ndarray): Candidate chunk ids per query, -1 for padding.
+        embeddings (np.ndarray): Stored float32 embeddings.
+        id_to_pos (dict): Chunk id -> row in embeddings.
+        k (int): Number of chunks to keep per query.
+
+    Returns:
+        List[List[int]]: The k closest candidate ids per query, closest first.
+    """
+    results = []
+    for query, row in zip(queries, candidates):
+        ids = [int(i) for i in row if i != -1]
+        if not ids:
+            results.append([])
+            continue
+        positions = np.array([id_to_pos[i] for i in ids])
+        # Sorted reads are friendlier to a memory-mapped file
+        order = np.argsort(positions)
+        vectors = np.asarray(embeddings[positions[order]], dtype="float32")
+        distances = np.empty(len(ids), dtype="float32")
+        distances[order] = ((vectors - query) ** 2).sum(axis=1)
+        best = np.argsort(distances, kind="stable")[:k]
+        results.append([ids[n] for n in best])
+    return results
+
+
+def set_search_params(index, nprobe=None, ef_search=None):
+    """Apply nprobe (IVF) or efSearch (HNSW) to an index, ignoring ones it lacks."""
+    params = faiss.ParameterSpace()
+    for name, value in (("nprobe", nprobe), ("efSearch", ef_search)):
+        if value is None:
+            continue
+        try:
+            params.set_index_parameter(index, name, value)
+        except RuntimeError:
+            pass
+
+
+def build_ann_index(embeddings, ids, factory: str, batch_size: int = 10000,
+                    max_train: int = 100000, seed: int = 0):
+    """
+    Train an approximate index on the stored embeddings and add them under their chunk ids.
+
+    Args:
+        embeddings (np.ndarray): float32 embeddings, possibly memory-mapped.
+        ids (np.ndarray): int64 chunk ids aligned with embeddings.
+        factory (str): FAISS index_factory string from factory_string().
+        batch_size (int): Number of vectors added at a time.
+        max_train (int): Upper bound on the training sample size.
+        seed (int): Seed for picking the training sample.
+
+    Returns:
+        faiss.Index: The trained and populated index.
+    """
+    count, dimension = embeddings.shape
+    index = faiss.index_factory(dimension, factory)
+    if not index.is_trained:
+        rng = np.random.default_rng(seed)
+        sample = np.sort(rng.choice(count, min(count, max_train), replace=False))
+        index.train(np.ascontiguousarray(embeddings[sample]))
+    if not isinstance(index, faiss.IndexIVF):
+        # HNSW numbers vectors sequentially, so map them to chunk ids explicitly
+        index = faiss.IndexIDMap2(index)
+    for start in range(0, count, batch_size):
+        index.add_with_ids(np.ascontiguousarray(embeddings[start:start + batch_size]),
+                           np.ascontiguousarray(ids[start:start + batch_size]))
+    return index
+
+
+def load_or_build_ann_index(store_path: str, embeddings, ids, index_type: str, **params):
+    """
+    Return the approximate index for a stored index directory, building it on first use.
+
+    The trained index is saved next to the stored embeddings, so it is only
+    rebuilt when the corpus or the index parameters change.
+
+    Args:
+        store_path (str): Directory of the stored index (StoredIndex.path).
+        embeddings (np.ndarray): Stored float32 embeddings.
+        ids (np.ndarray): Chunk ids aligned with embeddings.
+        index_type (str): One of INDEX_TYPES.
+        **params: nlist, pq_m, pq_nbits, hnsw_m and storage for factory_string().
+
+    Returns:
+        faiss.Index | None: The approximate index, or None if index_type is
+        "flat" with float32 storage or the corpus is too small to train it.
+    """
+    factory = factory_string(index_type, len(embeddings), embeddings.shape[1], **params)
+    if factory is None:
+        return None
+    path = os.path.join(store_path, f"ann-{content_hash(factory)[:16]}.faiss")
+    if os.path.exists(path):
+        return faiss.read_index(path)
+    index = build_ann_index(embeddings, ids, factory)
+    faiss.write_index(index, path)
+    return index
+
+
+def recall_at_k(found, truth) -> float:
+    """Share of the true neighbours (lists of ids per query) that appear in found."""
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / max(1, sum(len(t) for t in truth))
+
+
+def recall_report(embeddings, ids, k: int = 5, num_queries: int = 200, seed: int = 0,
+                  index_types=("ivf_flat", "ivf_pq", "hnsw"), **params):
+    """
+    Measure recall@k and latency of each approximate index against the flat index.
+
+    Queries are a random sample of the stored embeddings, the ground truth is
+    an exhaustive search, and every backend is swept over a range of nprobe or
+    efSearch values.
+
+    Args:
+        embeddings (np.ndarray): Stored float32 embeddings.
+        ids (np.ndarray): Chunk ids aligned with embeddings.
+        k (int): Number of neighbours retrieved per query.
+        num_queries (int): Number of sampled queries.
+        seed (int): Seed for sampling queries.
+        index_types (Iterable[str]): Backends to compare.
+        **params: nlist, pq_m, pq_nbits, hnsw_m and storage for factory_string().
+
+    Returns:
+        List[dict]: One row per configuration with "index_type", "factory",
+        "nprobe", "ef_search", "recall_at_k" and "ms_per_query".
+    """
+    count, dimension = embeddings.shape
+    rng = np.random.default_rng(seed)
+    queries = np.ascontiguousarray(
+        embeddings[np.sort(rng.choice(count, min(count, num_queries), replace=False))])
+
+    flat = faiss.IndexIDMap2(faiss.IndexFlatL2(dimension))
+    flat.add_with_ids(np.ascontiguousarray(embeddings), np.ascontiguousarray(ids))
+    start = time.perf_counter()
+    _, truth = flat.search(queries, k)
+    flat_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    rows = [dict(index_type="flat", factory="Flat", nprobe=None, ef_search=None,
+                 recall_at_k=1.0, ms_per_query=flat_ms)]
+
+    for index_type in index_types:
+        factory = factory_string(index_type, count, dimension, **params)
+        if factory is None:
+            continue
+        index = build_ann_index(embeddings, ids, factory)
+        if index_type == "hnsw":
+            settings = [dict(ef_search=ef) for ef in (16, 32, 64, 128, 256)]
+        else:
+            nlist = faiss.extract_index_ivf(index).nlist
+            settings = [dict(nprobe=p) for p in (1, 2, 4, 8, 16, 32, 64, 128) if p <= nlist]
+        for setting in settings:
+            set_search_params(index, **setting)
+            start = time.perf_counter()
+            _, found = index.search(queries, k)
+            ms = (time.perf_counter() - start) * 1000 / len(queries)
+            rows.append(dict(index_type=index_type, factory=factory,
+                             nprobe=setting.get("nprobe"), ef_search=setting.get("ef_search"),
+                             recall_at_k=recall_at_k(found.tolist(), truth.tolist()),
+                             ms_per_query=ms))
+    return rows
+
+
+def print_recall_report(rows):
+    """Print recall_report() rows as a table, followed by the raw JSON."""
+    print(f"{'index':<10} {'factory':<20} {'nprobe':>6} {'efSearch':>8} "
+          f"{'recall@k':>9} {'ms/query':>9}")
+    for row in rows:
+        print(f"{row['index_type']:<10} {row['factory']:<20} "
+              f"{row['nprobe'] if row['nprobe'] is not None else '-':>6} "
+              f"{row['ef_search'] if row['ef_search'] is not None else '-':>8} "
+              f"{row['recall_at_k']:>9.3f} {row['ms_per_query']:>9.3f}")
+    print(json.dumps(rows))
+
+
+def storage_report(embeddings, ids, k: int = 5, num_queries: int = 200, seed: int = 0,
+                   rerank_candidates: int = 50, storages=STORAGE_TYPES, pq_m: int = 16,
+                   pq_nbits: int = 8):
+    """
+    Measure the memory and recall@k of each embedding storage type.
+
+    Each storage type is searched exhaustively, both on its own and with its
+    top rerank_candidates re-ranked against the float32 embeddings, and
+    compared with an exact float32 search for a sample of stored embeddings.
+
+    Args:
+        embeddings (np.ndarray): Stored float32 embeddings.
+        ids (np.ndarray): Chunk ids aligned with embeddings.
+        k (int): Number of neighbours retrieved per query.
+        num_queries (int): Number of sampled queries.
+        seed (int): Seed for sampling queries.
+        rerank_candidates (int): Candidates re-ranked per query.
+        storages (Iterable[str]): Storage types to compare.
+        pq_m (int): Number of PQ sub-quantizers for pq storage.
+        pq_nbits (int): Bits per PQ code for pq storage.
+
+    Returns:
+        List[dict]: One row per storage type with "storage", "factory",
+        "bytes_per_vector", "index_mb", "recall_at_k", "ms_per_query",
+        "rerank_recall_at_k" and "rerank_ms_per_query".
+    """
+    count, dimension = embeddings.shape
+    rng = np.random.default_rng(seed)
+    queries = np.ascontiguousarray(
+        embeddings[np.sort(rng.choice(count, min(count, num_queries), replace=False))])
+    id_to_pos = {int(i): pos for pos, i in enumerate(ids)}
+    depth = max(k, rerank_candidates)
+
+    flat = faiss.IndexFlatL2(dimension)
+    flat.add(np.ascontiguousarray(embeddings))
+    _, truth = flat.search(queries, k)
+    truth = np.asarray(ids)[truth].tolist()
+
+    rows = []
+    for storage in storages:
+        codec = storage_codec(storage, count, dimension, pq_m, pq_nbits)
+        if codec is None:
+            continue
+        index = build_ann_index(embeddings, ids, codec)
+        start = time.perf_counter()
+        _, found = index.search(queries, k)
+        ms = (time.perf_counter() - start) * 1000 / len(queries)
+        start = time.perf_counter()
+        _, candidates = index.search(queries, depth)
+        reranked = rerank(queries, candidates, embeddings, id_to_pos, k)
+        rerank_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+        size = len(faiss.serialize_index(index))
+        rows.append(dict(
+            storage=storage, factory=codec,
+            bytes_per_vector=size / count, index_mb=size / 2 ** 20,
+            recall_at_k=recall_at_k(found.tolist(), truth), ms_per_query=ms,
+            rerank_recall_at_k=recall_at_k(reranked, truth), rerank_ms_per_query=rerank_ms,
+        ))
+    return rows
+
+
+def print_storage_report(rows):
+    """Print storage_report() rows as a table, followed by the raw JSON."""
+    print(f"{'storage':<8} {'factory':<10} {'bytes/vec':>9} {'index MB':>9} "
+          f"{'recall@k':>9} {'ms/query':>9} {'reranked':>9} {'ms/query':>9}")
+    for row in rows:
+        print(f"{row['storage']:<8} {row['factory']:<10} {row['bytes_per_vector']:>9.1f} "
+              f"{row['index_mb']:>9.2f} {row['recall_at_k']:>9.3f} {row['ms_per_query']:>9.3f} "
+              f"{row['rerank_recall_at_k']:>9.3f} {row['rerank_ms_per_query']:>9.3f}")
+    print(json.dumps(rows))
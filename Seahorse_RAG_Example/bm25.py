@@ -0,0 +1,136 @@
+import math
+import os
+import pickle
+import re
+from collections import Counter, defaultdict
+
+import numpy as np
+
+BM25_FILE = "bm25.pkl"
+
+# Very common words carry no signal for ranking and only slow scoring down
+STOPWORDS = frozenset(
+    "a an and are as at be by do does did for from has have how in is it its of on or "
+    "that the their there these they this to was were what when where which who why "
+    "will with you your".split()
+)
+
+
+def tokenize(text: str):
+    """Lowercase text and split it into word tokens, dropping stopwords."""
+    return [t for t in re.findall(r"\w+", text.lower()) if t not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a fixed list of chunks, stored as an inverted index.
+
+    Each posting already holds the term's full BM25 weight for that chunk
+    (idf and length normalisation included), so scoring a query is only a
+    sum of a few sparse arrays.
+
+    Args:
+        texts (List[str]): Chunk texts, in the same order as the engine's chunks.
+        k1 (float): Term frequency saturation.
+        b (float): Strength of document length normalisation.
+    """
+    def __init__(self, texts, k1: float = 1.5, b: float = 0.75):
+        self.count = len(texts)
+        tokenized = [Counter(tokenize(t)) for t in texts]
+        lengths = np.array([sum(tf.values()) for tf in tokenized], dtype="float32")
+        avg_length = float(lengths.mean()) if self.count else 0.0
+
+        postings = defaultdict(list)
+        for pos, tf in enumerate(tokenized):
+            for term, freq in tf.items():
+                postings[term].append((pos, freq))
+
+        # term -> (chunk positions, BM25 weights)
+        self.postings = {}
+        for term, entries in postings.items():
+            positions = np.array([p for p, _ in entries], dtype="int64")
+            freqs = np.array([f for _, f in entries], dtype="float32")
+            idf = math.log(1 + (self.count - len(entries) + 0.5) / (len(entries) + 0.5))
+            norm = k1 * (1 - b + b * lengths[positions] / max(avg_length, 1e-9))
+            self.postings[term] = (positions, idf * freqs * (k1 + 1) / (freqs + norm))
+
+    def scores(self, query: str):
+        """Return the BM25 score of every chunk for query."""
+        scores = np.zeros(self.count, dtype="float32")
+        for term in set(tokenize(query)):
+            if term in self.postings:
+                positions, weights = self.postings[term]
+                scores[positions] += weights
+        return scores
+
+    def search(self, query: str, k: int):
+        """
+        Return the top k chunks for query.
+
+        Args:
+            query (str): The input question string.
+            k (int): Number of chunks to return.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Chunk positions and their scores,
+            best first; chunks scoring 0 are left out.
+        """
+        scores = self.scores(query)
+        k = min(k, self.count)
+        if k == 0:
+            return np.empty(0, dtype="int64"), np.empty(0, dtype="float32")
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        top = top[scores[top] > 0]
+        return top, scores[top]
+
+
+def is_decisive(scores, ratio: float, min_score: float = 0.0) -> bool:
+    """
+    Decide whether a sparse ranking is clear enough to skip dense retrieval.
+
+    True when the best chunk scores at least min_score and outscores the
+    runner-up by at least ratio, which is typical of queries built around a
+    rare keyword such as a species name or a date. A lone candidate is never
+    decisive: one chunk sharing a single term with the question says
+    little, so those questions still go through hybrid retrieval.
+    """
+    if len(scores) < 2:
+        return False
+    return scores[0] >= min_score and scores[0] >= ratio * scores[1]
+
+
+def reciprocal_rank_fusion(rankings, k: int, rrf_k: int = 60):
+    """
+    Merge several rankings with reciprocal-rank fusion.
+
+    Args:
+        rankings (List[List[int]]): Ids from each retriever, best first.
+        k (int): Number of ids to return.
+        rrf_k (int): Damping constant; 60 is the value from the original paper.
+
+    Returns:
+        List[int]: The k ids with the highest fused score.
+    """
+    fused = defaultdict(float)
+    for ranking in rankings:
+        for rank, i in enumerate(ranking):
+            fused[i] += 1.0 / (rrf_k + rank + 1)
+    return sorted(fused, key=fused.get, reverse=True)[:k]
+
+
+def load_or_build_bm25(store_path: str, texts, **params):
+    """
+    Return the BM25 index for a stored index directory, building it on first use.
+
+    Like the approximate indexes, it is saved next to the stored chunks and so
+    is rebuilt whenever the corpus changes.
+    """
+    path = os.path.join(store_path, BM25_FILE)
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    index = BM25Index(texts, **params)
+    with open(path, "wb") as f:
+        pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return index
@@ -0,0 +1,161 @@
+import re
+
+try:
+    import tiktoken
+except ImportError:  # optional: fall back to a characters-per-token estimate
+    tiktoken = None
+
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count the tokens in text.
+
+    Uses tiktoken's cl100k_base encoding when tiktoken is installed, otherwise
+    estimates about four characters per token.
+    """
+    global _encoding
+    if tiktoken is not None:
+        if _encoding is None:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        return len(_encoding.encode(text))
+    return (len(text) + 3) // 4
+
+
+def merge_spans(records, adjacent_gap: int = 2):
+    """
+    Merge overlapping or adjacent chunks from the same document into contiguous spans.
+
+    Chunks are exact substrings of their source at [start, end), so the
+    overlapping part of the next chunk can be spliced off exactly instead of
+    repeating it.
+
+    Args:
+        records (List[dict]): Chunk records ("text", "source", "start", "end"),
+            best match first.
+        adjacent_gap (int): Chunks separated by at most this many characters
+            (usually just the whitespace the splitter stripped) are joined too,
+            with a line break in place of that whitespace, so paragraph and
+            list breaks are not run together.
+
+    Returns:
+        List[dict]: Spans with "text", "source", "start", "end" and "rank"
+        (the best rank among their chunks), best rank first.
+    """
+    by_source = {}
+    for rank, record in enumerate(records):
+        by_source.setdefault(record.get("source"), []).append(dict(record, rank=rank))
+
+    spans = []
+    for items in by_source.values():
+        if items[0].get("start") is None:
+            spans.extend(items)
+            continue
+        items.sort(key=lambda r: r["start"])
+        current = items[0]
+        for item in items[1:]:
+            if item["start"] <= current["end"]:
+                # Overlap: keep only the part of item past the current span
+                if item["end"] > current["end"]:
+                    tail = item["text"][current["end"] - item["start"]:]
+                    current = dict(current, text=current["text"] + tail, end=item["end"])
+                current["rank"] = min(current["rank"], item["rank"])
+            elif item["start"] - current["end"] <= adjacent_gap:
+                joiner = "\n" if item["start"] > current["end"] else ""
+                current = dict(current, text=current["text"] + joiner + item["text"],
+                               end=item["end"], rank=min(current["rank"], item["rank"]))
+            else:
+                spans.append(current)
+                current = item
+        spans.append(current)
+    return sorted(spans, key=lambda s: s["rank"])
+
+
+def shingles(text: str, size: int = 5):
+    """Return the set of size-word shingles of text, for near-duplicate detection."""
+    words = re.findall(r"\w+", text.lower())
+    if len(words) <= size:
+        return {tuple(words)}
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def drop_near_duplicates(spans, threshold: float = 0.8):
+    """
+    Drop spans whose shingles mostly repeat a better-ranked span.
+
+    Similarity is containment (the share of a span's shingles already present
+    in a kept span), so a passage repeated inside a longer one is caught too.
+
+    Args:
+        spans (List[dict]): Spans, best rank first.
+        threshold (float): Containment at or above which a span is dropped.
+
+    Returns:
+        List[dict]: The remaining spans, in the same order.
+    """
+    kept, kept_shingles = [], []
+    for span in spans:
+        s = shingles(span["text"])
+        if any(len(s & k) / max(1, len(s)) >= threshold for k in kept_shingles):
+            continue
+        kept.append(span)
+        kept_shingles.append(s)
+    return kept
+
+
+def truncate_to_tokens(text: str, budget: int) -> str:
+    """Cut text to fit in budget tokens, ending at a sentence or word boundary."""
+    if count_tokens(text) <= budget:
+        return text
+    # Binary search for the longest prefix that fits
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if count_tokens(text[:mid]) <= budget:
+            low = mid
+        else:
+            high = mid - 1
+    prefix = text[:low]
+    sentence_end = max(prefix.rfind(". "), prefix.rfind(".\n"))
+    if sentence_end > len(prefix) // 2:
+        return prefix[:sentence_end + 1]
+    return prefix.rsplit(" ", 1)[0] if " " in prefix else prefix
+
+
+def build_context(records, token_budget: int, duplicate_threshold: float = 0.8,
+                  min_tail_tokens: int = 32, separator: str = "\n\n"):
+    """
+    Turn retrieved chunks into the smallest context that still covers them.
+
+    Overlapping and adjacent chunks are merged back into contiguous spans,
+    near-duplicate spans are dropped, and spans are packed best-first until
+    token_budget is reached; the last span is truncated if at least
+    min_tail_tokens of it fit.
+
+    Args:
+        records (List[dict]): Chunk records, best match first.
+        token_budget (int): Maximum tokens for the joined context.
+        duplicate_threshold (float): See drop_near_duplicates().
+        min_tail_tokens (int): Smallest truncated span worth including.
+        separator (str): Text placed between spans.
+
+    Returns:
+        List[str]: Context passages, most relevant first.
+    """
+    spans = drop_near_duplicates(merge_spans(records), duplicate_threshold)
+    passages = []
+    used = 0
+    sep_tokens = count_tokens(separator)
+    for span in spans:
+        cost = count_tokens(span["text"]) + (sep_tokens if passages else 0)
+        remaining = token_budget - used
+        if cost <= remaining:
+            passages.append(span["text"])
+            used += cost
+            continue
+        room = remaining - (sep_tokens if passages else 0)
+        if room >= min_tail_tokens:
+            passages.append(truncate_to_tokens(span["text"], room))
+        break
+    return passages
@@ -0,0 +1,299 @@
+import hashlib
+import json
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+from collections import namedtuple
+
+import numpy as np
+import faiss
+
+from ingest import batched
+
+# File names used inside each stored index directory
+CHUNKS_FILE = "chunks.jsonl"
+IDS_FILE = "ids.npy"
+EMBEDDINGS_FILE = "embeddings.f32"
+INDEX_FILE = "index.faiss"
+META_FILE = "meta.json"
+
+# Everything loaded from one index directory. chunks (dicts with "text",
+# "source", "start" and "end"), ids and the rows of embeddings are aligned;
+# faiss_index is keyed by ids. path is the generation directory it came from,
+# where indexes derived from it (ANN, BM25) are stored too.
+StoredIndex = namedtuple("StoredIndex", "chunks ids embeddings faiss_index meta path")
+
+
+def content_hash(text: str) -> str:
+    """Return the SHA-256 hex digest of a piece of text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def chunk_id(chunk: str) -> int:
+    """
+    Derive a stable FAISS id from the contents of a chunk.
+
+    Identical chunk text always maps to the same id, which is what lets a
+    rebuild recognise chunks it has already embedded.
+
+    Args:
+        chunk (str): Chunk text.
+
+    Returns:
+        int: Non-negative 63-bit id.
+    """
+    digest = hashlib.blake2b(chunk.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") & 0x7FFFFFFFFFFFFFFF
+
+
+def index_key(chunk_size: int, chunk_overlap: int, model_name: str) -> str:
+    """
+    Build a cache key from the settings that make stored embeddings incompatible.
+
+    The corpus contents are deliberately not part of the key: a changed
+    corpus updates the existing index instead of starting over.
+
+    Args:
+        chunk_size (int): Chunk size passed to the text splitter.
+        chunk_overlap (int): Chunk overlap passed to the text splitter.
+        model_name (str): Name of the SentenceTransformer model.
+
+    Returns:
+        str: Hex digest identifying this combination of settings.
+    """
+    return content_hash(f"{chunk_size}\0{chunk_overlap}\0{model_name}")
+
+
+def new_faiss_index(dimension: int):
+    """Create an empty flat L2 index that stores vectors under explicit ids."""
+    return faiss.IndexIDMap2(faiss.IndexFlatL2(dimension))
+
+
+def generations(index_dir: str, key: str):
+    """
+    Return the stored generations of an index as (number, path) pairs, oldest first.
+
+    Every update writes a new directory "<key>.<n>" next to the previous one,
+    so files still mapped from an older generation are never deleted or
+    replaced underneath a reader. A plain "<key>" directory, from before
+    generations were numbered, counts as the oldest.
+    """
+    try:
+        names = os.listdir(index_dir)
+    except OSError:
+        return []
+    found = []
+    for name in names:
+        number = name[len(key) + 1:] if name.startswith(key + ".") else None
+        if number is not None and number.isdigit():
+            found.append((int(number), os.path.join(index_dir, name)))
+        elif name == key:
+            found.append((-1, os.path.join(index_dir, name)))
+    return sorted(found)
+
+
+def load_index(index_dir: str, key: str, mmap: bool = False):
+    """
+    Load the newest saved generation of the index for the given key.
+
+    The embeddings are memory-mapped rather than read into memory, so loading
+    costs the same regardless of corpus size. Older generations are deleted
+    once the newest has loaded; one still open elsewhere (Windows refuses
+    to delete mapped files) is left for a later load to remove.
+
+    Args:
+        index_dir (str): Root directory holding the stored indexes.
+        key (str): Cache key produced by index_key().
+        mmap (bool): Memory-map the flat FAISS index too, for callers that
+            search a compressed index instead and only need the flat one
+            for updates.
+
+    Returns:
+        StoredIndex | None: The stored index, or None if nothing usable is
+        stored for this key.
+    """
+    found = generations(index_dir, key)
+    if not found:
+        return None
+    path = found[-1][1]
+    try:
+        with open(os.path.join(path, META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(os.path.join(path, CHUNKS_FILE), "r", encoding="utf-8") as f:
+            chunks = [json.loads(line) for line in f]
+        ids = np.load(os.path.join(path, IDS_FILE))
+        embeddings = np.memmap(os.path.join(path, EMBEDDINGS_FILE), dtype="float32",
+                               mode="r", shape=(meta["count"], meta["dimension"]))
+        faiss_index = faiss.read_index(os.path.join(path, INDEX_FILE),
+                                       faiss.IO_FLAG_MMAP if mmap else 0)
+    except (OSError, ValueError, KeyError, RuntimeError):
+        return None
+
+    count = meta["count"]
+    if len(chunks) != count or len(ids) != count or faiss_index.ntotal != count:
+        return None
+    for _, old_path in found[:-1]:
+        shutil.rmtree(old_path, ignore_errors=True)
+    return StoredIndex(chunks, ids, embeddings, faiss_index, meta, path)
+
+
+def update_index(index_dir: str, key: str, previous, records, encode, dimension: int,
+                 batch_size: int = 64, mmap: bool = False, **meta):
+    """
+    Bring the stored index up to date with a stream of chunk records.
+
+    Records are consumed in batches and written straight to disk, so memory
+    stays bounded by the batch size rather than the corpus size. Chunks whose
+    text is already in the previous index keep their stored embedding,
+    vectors for chunks that disappeared are removed from the FAISS index, and
+    only new or modified chunks are passed to encode. Duplicate chunk texts
+    are indexed once, under the first record seen.
+
+    Everything is written to a temporary directory first and then renamed to
+    the next generation (see generations()), so an interrupted build never
+    leaves a half-written index behind and previous, whose files may still
+    be memory-mapped, stays untouched until a later load removes it.
+
+    Args:
+        index_dir (str): Root directory holding the stored indexes.
+        key (str): Cache key produced by index_key().
+        previous (StoredIndex | None): Index loaded from disk, or None to build from scratch.
+        records (Iterable[dict]): Chunk records, e.g. from ingest.iter_chunks().
+        encode (Callable[[List[str]], np.ndarray]): Encodes a list of chunks to float32 vectors.
+        dimension (int): Embedding dimension, used when building from scratch.
+        batch_size (int): Number of records encoded and written at a time.
+        mmap (bool): Passed to load_index() when loading the result back.
+        **meta: Values recorded in the new index's meta.json.
+
+    Returns:
+        Tuple[StoredIndex, int, int]: The updated index as loaded back from
+        disk, and the number of chunks that were added and removed.
+    """
+    if previous is None:
+        old_pos = {}
+        faiss_index = new_faiss_index(dimension)
+    else:
+        old_pos = {int(i): pos for pos, i in enumerate(previous.ids)}
+        faiss_index = previous.faiss_index
+
+    os.makedirs(index_dir, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(prefix=".tmp-", dir=index_dir)
+    try:
+        seen = set()
+        ids = []
+        added = 0
+        with open(os.path.join(tmp_path, CHUNKS_FILE), "w", encoding="utf-8") as chunks_file, \
+                open(os.path.join(tmp_path, EMBEDDINGS_FILE), "wb") as emb_file:
+            for batch in batched(records, batch_size):
+                unique = {}
+                for record in batch:
+                    i = chunk_id(record["text"])
+                    if i not in seen and i not in unique:
+                        unique[i] = record
+                if not unique:
+                    continue
+                seen.update(unique)
+                batch = list(unique.values())
+                batch_ids = np.fromiter(unique, dtype="int64", count=len(unique))
+                vectors = np.empty((len(batch), faiss_index.d), dtype="float32")
+
+                # Reuse stored rows for unchanged chunks and encode only the new ones
+                kept = [(n, old_pos[i]) for n, i in enumerate(batch_ids.tolist()) if i in old_pos]
+                if kept:
+                    rows, old_rows = (np.array(x) for x in zip(*kept))
+                    vectors[rows] = previous.embeddings[old_rows]
+                new = np.array([n for n, i in enumerate(batch_ids.tolist()) if i not in old_pos],
+                               dtype="int64")
+                if len(new):
+                    new_vectors = np.asarray(encode([batch[n]["text"] for n in new]),
+                                             dtype="float32")
+                    vectors[new] = new_vectors
+                    faiss_index.add_with_ids(new_vectors, batch_ids[new])
+                    added += len(new)
+
+                for record in batch:
+                    chunks_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+                emb_file.write(vectors.tobytes())
+                ids.extend(batch_ids.tolist())
+
+        # Drop vectors whose chunk no longer exists
+        stale = np.array([i for i in old_pos if i not in seen], dtype="int64")
+        if len(stale):
+            faiss_index.remove_ids(stale)
+
+        np.save(os.path.join(tmp_path, IDS_FILE), np.array(ids, dtype="int64"))
+        faiss.write_index(faiss_index, os.path.join(tmp_path, INDEX_FILE))
+        meta.update(count=len(ids), dimension=int(faiss_index.d))
+        with open(os.path.join(tmp_path, META_FILE), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+
+        found = generations(index_dir, key)
+        number = found[-1][0] + 1 if found else 0
+        os.replace(tmp_path, os.path.join(index_dir, f"{key}.{number}"))
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+
+    return load_index(index_dir, key, mmap=mmap), added, len(stale)
+
+
+# Function to check repeated updates of one stored index
+def run_self_test() -> bool:
+    """
+    Update one index twice in a row, each time from the index loaded before.
+
+    The previous index stays memory-mapped while the next one is written, as
+    in RAGEngine, so this covers the case where its files cannot be removed.
+
+    Returns:
+        bool: True if every check passed.
+    """
+    def encode(texts):
+        return np.array([[len(t), sum(map(ord, t)) % 97, t.count("e"), 1.0] for t in texts],
+                        dtype="float32")
+
+    def records(texts):
+        return [{"text": t, "source": "doc.txt", "start": 0, "end": len(t)} for t in texts]
+
+    versions = [["alpha", "beta", "gamma"], ["alpha", "gamma", "delta", "epsilon"],
+                ["epsilon", "zeta"]]
+    key = index_key(8, 0, "test-model")
+    checks = []
+    with tempfile.TemporaryDirectory() as index_dir:
+        stored = None
+        for n, texts in enumerate(versions):
+            previous = load_index(index_dir, key, mmap=True)
+            checks.append(((previous is None) == (n == 0),
+                           f"update {n}: previous generation {'not ' if previous is None else ''}found"))
+            stored, added, removed = update_index(index_dir, key, previous, records(texts),
+                                                  encode, 4, batch_size=2, mmap=True)
+            old_ids = set() if previous is None else {int(i) for i in previous.ids}
+            new_ids = {chunk_id(t) for t in texts}
+            checks.append((stored is not None
+                           and [c["text"] for c in stored.chunks] == texts
+                           and np.array_equal(np.asarray(stored.embeddings), encode(texts))
+                           and stored.faiss_index.ntotal == len(texts)
+                           and (added, removed) == (len(new_ids - old_ids), len(old_ids - new_ids)),
+                           f"update {n}: {len(texts)} chunks, {added} added, {removed} removed"))
+            del previous
+        latest = load_index(index_dir, key)
+        left = [os.path.basename(p) for _, p in generations(index_dir, key)]
+        checks.append((latest is not None and left == [f"{key}.{len(versions) - 1}"],
+                       f"older generations removed on load ({len(left)} left)"))
+        del stored, latest
+
+    for passed, message in checks:
+        print(f"{'PASS' if passed else 'FAIL'}: {message}")
+    return all(passed for passed, _ in checks)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stored chunk and embedding index.")
+    parser.add_argument("--test", action="store_true",
+                        help="update a temporary index repeatedly and exit")
+    args = parser.parse_args()
+    if args.test:
+        sys.exit(0 if run_self_test() else 1)
+    parser.print_help()
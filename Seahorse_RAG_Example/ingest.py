@@ -0,0 +1,157 @@
+import fnmatch
+import hashlib
+import os
+from itertools import islice
+
+
+def list_documents(corpus_path: str, pattern: str = "*.txt"):
+    """
+    List the documents that make up the corpus.
+
+    Args:
+        corpus_path (str): A single document, or a directory searched recursively.
+        pattern (str): Filename pattern documents in a directory must match.
+
+    Returns:
+        List[str]: Document paths in a stable (sorted) order.
+    """
+    if os.path.isfile(corpus_path):
+        return [corpus_path]
+    paths = []
+    for root, dirs, files in os.walk(corpus_path):
+        dirs.sort()
+        paths.extend(os.path.join(root, name) for name in sorted(files)
+                     if fnmatch.fnmatch(name, pattern))
+    return paths
+
+
+def corpus_fingerprint(paths) -> str:
+    """
+    Cheaply fingerprint a corpus from file names, sizes and modification times.
+
+    Used to decide whether the stored index can be reused without reading
+    any document. A touched but unchanged file only costs a re-split, since
+    chunk ids are content based.
+    """
+    h = hashlib.sha256()
+    for path in paths:
+        st = os.stat(path)
+        h.update(f"{path}\0{st.st_size}\0{st.st_mtime_ns}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+def iter_segments(path: str, block_size: int = 1 << 20):
+    """
+    Read a document in blocks of roughly block_size characters.
+
+    Blocks are cut at paragraph breaks where possible so the splitter sees
+    whole paragraphs, and memory stays bounded even for very large files.
+
+    Args:
+        path (str): Document to read.
+        block_size (int): Number of characters read at a time.
+
+    Yields:
+        Tuple[int, str]: Character offset of the segment in the document, and its text.
+    """
+    offset = 0
+    carry = ""
+    with open(path, "r", encoding="utf-8") as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            buf = carry + block
+            cut = buf.rfind("\n\n")
+            if cut <= 0:
+                if len(buf) < 2 * block_size:
+                    # Keep reading until a paragraph break turns up
+                    carry = buf
+                    continue
+                # No paragraph break at all: fall back to the last space
+                cut = buf.rfind(" ") if buf.rfind(" ") > 0 else len(buf)
+            yield offset, buf[:cut]
+            offset += cut
+            carry = buf[cut:]
+    if carry.strip():
+        yield offset, carry
+
+
+def split_with_offsets(text_splitter, text: str):
+    """
+    Split text into chunks and locate each one in it.
+
+    Offsets come from the splitter's own start_index metadata when it was
+    created with add_start_index=True, and from the same forward search
+    otherwise.
+
+    Returns:
+        List[Tuple[str, int]]: (chunk, character offset in text) pairs.
+
+    Raises:
+        ValueError: If a chunk cannot be found in text, rather than record
+            wrong provenance.
+    """
+    if getattr(text_splitter, "_add_start_index", False):
+        pairs = [(doc.page_content, doc.metadata.get("start_index", -1))
+                 for doc in text_splitter.create_documents([text])]
+    else:
+        overlap = getattr(text_splitter, "_chunk_overlap", 0)
+        pairs = []
+        index = 0
+        previous_len = 0
+        for chunk in text_splitter.split_text(text):
+            index = text.find(chunk, max(0, index + previous_len - overlap))
+            previous_len = len(chunk)
+            pairs.append((chunk, index))
+    for chunk, start in pairs:
+        if start < 0 or text[start:start + len(chunk)] != chunk:
+            raise ValueError(f"Could not locate chunk {chunk[:40]!r} in its source text.")
+    return pairs
+
+
+def iter_chunks(paths, text_splitter, block_size: int = 1 << 20):
+    """
+    Stream chunk records with provenance from a list of documents.
+
+    The last chunk of each segment is held back and its text is split again
+    together with the next segment, so chunks keep their overlap across
+    segment boundaries just as if the document had been split whole.
+
+    Args:
+        paths (List[str]): Documents to ingest.
+        text_splitter: Splitter with split_text() (and ideally add_start_index=True).
+        block_size (int): Number of characters read from a document at a time.
+
+    Yields:
+        dict: {"text", "source", "start", "end"}, where start/end are
+        character offsets of the chunk in its source document.
+    """
+    for path in paths:
+        carry = ""
+        segments = iter_segments(path, block_size)
+        segment = next(segments, None)
+        while segment is not None:
+            seg_offset, seg_text = segment
+            text = carry + seg_text
+            offset = seg_offset - len(carry)
+            segment = next(segments, None)
+            pairs = split_with_offsets(text_splitter, text)
+            if segment is not None and pairs:
+                # Re-split the last chunk with the following text
+                carry = text[pairs.pop()[1]:]
+            else:
+                carry = ""
+            for chunk, start in pairs:
+                yield {"text": chunk, "source": path, "start": offset + start,
+                       "end": offset + start + len(chunk)}
+
+
+def batched(iterable, size: int):
+    """Yield lists of up to size items from iterable."""
+    it = iter(iterable)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
@@ -0,0 +1,358 @@
+import asyncio
+import json
+import queue
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# --------- Backends ---------
+class ChatBackend:
+    """
+    Interface for chat completion backends.
+
+    Subclasses implement complete() and, if they can, stream(); retryable
+    lists the exceptions that are worth retrying (timeouts, connection
+    errors, rate limits).
+    """
+    retryable = (asyncio.TimeoutError, ConnectionError)
+
+    async def complete(self, messages, model: str, temperature: float, max_tokens: int) -> str:
+        raise NotImplementedError
+
+    async def stream(self, messages, model: str, temperature: float, max_tokens: int):
+        """Yield the reply in pieces as they arrive; by default all at once."""
+        yield await self.complete(messages, model, temperature, max_tokens)
+
+    async def aclose(self):
+        pass
+
+
+class OpenAIBackend(ChatBackend):
+    """
+    OpenAI Chat Completions through a single AsyncOpenAI client.
+
+    The client keeps one pooled HTTP connection set for its lifetime. The
+    SDK's own retries are disabled because AsyncLLMClient does the retrying.
+    """
+    def __init__(self, api_key=None, base_url=None):
+        import openai
+        self.client = openai.AsyncOpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+        self.retryable = ChatBackend.retryable + (
+            openai.APITimeoutError, openai.APIConnectionError,
+            openai.RateLimitError, openai.InternalServerError,
+        )
+
+    async def complete(self, messages, model, temperature, max_tokens):
+        resp = await self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+        )
+        return resp.choices[0].message.content.strip()
+
+    async def stream(self, messages, model, temperature, max_tokens):
+        resp = await self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True,
+        )
+        async for chunk in resp:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    async def aclose(self):
+        await self.client.close()
+
+
+def split_tokens(text: str):
+    """Split text into word-sized pieces that join back to the original."""
+    return re.findall(r"\s*\S+", text)
+
+
+def local_answer(messages) -> str:
+    """
+    Deterministically answer from the prompt without a language model.
+
+    Returns the context sentence sharing the most words with the question, or
+    "I don't know." when nothing overlaps. Good enough to exercise the
+    pipeline end to end and to benchmark it offline.
+    """
+    prompt = messages[-1]["content"]
+    context, _, question = prompt.partition("Question:")
+    question_words = set(re.findall(r"\w+", question.lower()))
+    best, best_score = None, 0
+    for sentence in re.split(r"(?<=[.!?])\s+|\n\s*\n", context.replace("Context:", "", 1)):
+        score = len(question_words & set(re.findall(r"\w+", sentence.lower())))
+        if score > best_score:
+            best, best_score = sentence.strip(), score
+    return best if best else "I don't know."
+
+
+class LocalBackend(ChatBackend):
+    """
+    In-process deterministic stand-in for the OpenAI backend.
+
+    Args:
+        latency (float): Seconds to wait per request, to simulate a remote model.
+        token_delay (float): Seconds between streamed tokens.
+    """
+    def __init__(self, latency: float = 0.0, token_delay: float = 0.0):
+        self.latency = latency
+        self.token_delay = token_delay
+
+    async def complete(self, messages, model, temperature, max_tokens):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return local_answer(messages)
+
+    async def stream(self, messages, model, temperature, max_tokens):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        for n, token in enumerate(split_tokens(local_answer(messages))):
+            if n and self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            yield token
+
+
+def make_backend(name: str, api_key=None, base_url=None, latency: float = 0.0,
+                 token_delay: float = 0.0):
+    """Create the backend called name ("openai" or "local")."""
+    if name == "openai":
+        return OpenAIBackend(api_key=api_key, base_url=base_url)
+    if name == "local":
+        return LocalBackend(latency=latency, token_delay=token_delay)
+    raise ValueError(f"Unknown LLM backend '{name}'. Choose from: openai, local")
+
+
+# --------- Client ---------
+class AsyncLLMClient:
+    """
+    Concurrent chat completion client running on its own event loop thread.
+
+    Requests from any thread (or any other event loop) are scheduled onto one
+    long-lived loop, so the backend's connections are reused across calls.
+    A semaphore caps the number of requests in flight, each attempt has a
+    timeout, and retryable failures are retried with exponential backoff.
+
+    Args:
+        backend (ChatBackend): Where completions come from.
+        model (str): Chat model name.
+        max_concurrency (int): Maximum requests in flight at once.
+        timeout (float): Seconds allowed per attempt.
+        max_retries (int): Retries after the first failed attempt.
+        backoff (float): Base delay in seconds; doubles on each retry, plus jitter.
+        temperature (float): Sampling temperature.
+        max_tokens (int): Maximum tokens in each reply.
+    """
+    def __init__(self, backend, model: str, max_concurrency: int = 8, timeout: float = 30.0,
+                 max_retries: int = 3, backoff: float = 0.5, temperature: float = 0.0,
+                 max_tokens: int = 500):
+        self.backend = backend
+        self.model = model
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="llm-client",
+                                       daemon=True)
+        self.thread.start()
+        self.semaphore = self.run(self._make_semaphore(max_concurrency))
+
+    @staticmethod
+    async def _make_semaphore(n):
+        # Created on the client's loop so it is bound to that loop
+        return asyncio.Semaphore(max(1, n))
+
+    def submit(self, coro):
+        """Schedule a coroutine on the client's loop and return a concurrent Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro):
+        """Run a coroutine on the client's loop and block until it finishes."""
+        return self.submit(coro).result()
+
+    async def complete(self, messages) -> str:
+        """
+        Return the model's reply to messages, retrying transient failures.
+
+        Must be awaited on the client's loop; use submit()/run() or
+        complete_async() from elsewhere.
+        """
+        async with self.semaphore:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    return await asyncio.wait_for(
+                        self.backend.complete(messages, self.model, self.temperature,
+                                              self.max_tokens),
+                        self.timeout)
+                except self.backend.retryable:
+                    if attempt == self.max_retries:
+                        raise
+                    delay = self.backoff * 2 ** attempt
+                    await asyncio.sleep(delay + random.uniform(0, delay))
+
+    async def complete_async(self, messages) -> str:
+        """complete() that can be awaited from any event loop."""
+        return await asyncio.wrap_future(self.submit(self.complete(messages)))
+
+    def complete_sync(self, messages) -> str:
+        """Blocking complete() for synchronous callers."""
+        return self.run(self.complete(messages))
+
+    async def stream(self, messages):
+        """
+        Yield the model's reply to messages piece by piece as it arrives.
+
+        The timeout applies to each piece rather than the whole reply, and
+        failures are only retried before the first piece has been yielded.
+        Must be iterated on the client's loop; use iterate() from elsewhere.
+        """
+        async with self.semaphore:
+            for attempt in range(self.max_retries + 1):
+                started = False
+                pieces = self.backend.stream(messages, self.model, self.temperature,
+                                             self.max_tokens)
+                try:
+                    while True:
+                        try:
+                            piece = await asyncio.wait_for(pieces.__anext__(), self.timeout)
+                        except StopAsyncIteration:
+                            return
+                        started = True
+                        yield piece
+                except self.backend.retryable:
+                    if started or attempt == self.max_retries:
+                        raise
+                    delay = self.backoff * 2 ** attempt
+                    await asyncio.sleep(delay + random.uniform(0, delay))
+                finally:
+                    await pieces.aclose()
+
+    def iterate(self, agen):
+        """
+        Iterate an async generator on the client's loop from synchronous code.
+
+        Items are handed over through a queue as soon as they are produced.
+        """
+        items = queue.Queue()
+        done = object()
+
+        async def pump():
+            try:
+                async for item in agen:
+                    items.put((item, None))
+            except BaseException as e:
+                items.put((None, e))
+            else:
+                items.put((done, None))
+
+        self.submit(pump())
+        while True:
+            item, error = items.get()
+            if error is not None:
+                raise error
+            if item is done:
+                return
+            yield item
+
+    def close(self):
+        """Close the backend and stop the loop thread."""
+        self.run(self.backend.aclose())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+
+# --------- Local stand-in server ---------
+class StandInHandler(BaseHTTPRequestHandler):
+    """Minimal OpenAI-compatible /v1/chat/completions endpoint backed by local_answer()."""
+    latency = 0.0
+    token_delay = 0.0
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/v1/chat/completions":
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        if self.latency:
+            time.sleep(self.latency)
+        answer = local_answer(body["messages"])
+        if body.get("stream"):
+            self.send_stream(body, answer)
+            return
+        payload = json.dumps({
+            "id": "chatcmpl-local",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "local"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": answer}}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def send_stream(self, body, answer):
+        """Send the answer as server-sent events, one chunk per word."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        for token in split_tokens(answer) + [None]:
+            delta = {"content": token} if token is not None else {}
+            chunk = json.dumps({
+                "id": "chatcmpl-local",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get("model", "local"),
+                "choices": [{"index": 0, "delta": delta,
+                             "finish_reason": None if token is not None else "stop"}],
+            })
+            self.wfile.write(f"data: {chunk}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            if token is not None and self.token_delay:
+                time.sleep(self.token_delay)
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_stand_in(host: str = "127.0.0.1", port: int = 8001, latency: float = 0.0,
+                   token_delay: float = 0.0):
+    """
+    Start the stand-in server in a background thread.
+
+    Point the openai backend at it with base_url=f"http://{host}:{port}/v1".
+
+    Returns:
+        ThreadingHTTPServer: The running server; call shutdown() to stop it.
+    """
+    handler = type("Handler", (StandInHandler,),
+                   {"latency": latency, "token_delay": token_delay})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    # python llm_client.py [port] [latency_seconds] [token_delay_seconds]
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8001
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+    token_delay = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+    server = serve_stand_in(port=port, latency=latency, token_delay=token_delay)
+    print(f"Stand-in chat completions server on http://127.0.0.1:{port}/v1 (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
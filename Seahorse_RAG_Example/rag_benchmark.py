@@ -0,0 +1,203 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import RAG_app
+
+# Fixed question set, so runs are comparable across commits
+DEFAULT_QUESTIONS = [
+    "What is a group of seahorses called?",
+    "Does a seahorse have gills?",
+    "How many species of seahorses are there?",
+    "Tell me about seahorse courtship.",
+    "Which parent carries the eggs?",
+    "What do seahorses eat?",
+    "How do seahorses swim?",
+    "Where do seahorses live?",
+    "How long do seahorses live?",
+    "Why are seahorses threatened?",
+    "What is the scientific name of the seahorse genus?",
+    "How big is the smallest seahorse?",
+    "How do seahorses avoid predators?",
+    "Are seahorses monogamous?",
+    "How many young does a male seahorse give birth to?",
+    "What is the brood pouch?",
+    "How are seahorses used in traditional medicine?",
+    "What are pygmy seahorses?",
+    "How do seahorses change colour?",
+    "What is the fossil record of seahorses?",
+]
+
+
+def percentiles(samples):
+    """Return the p50, p95 and p99 of a list of seconds, in milliseconds."""
+    values = np.percentile(np.array(samples) * 1000, [50, 95, 99])
+    return {"p50_ms": float(values[0]), "p95_ms": float(values[1]), "p99_ms": float(values[2])}
+
+
+def brute_force_ids(engine, questions, k: int):
+    """Return the exact top k chunk ids per question by scanning every stored embedding."""
+    queries = engine.encode_questions(questions)
+    results = []
+    for query in queries:
+        distances = np.zeros(len(engine.embeddings), dtype="float32")
+        # Scan in blocks so a memory-mapped corpus is never loaded whole
+        for start in range(0, len(engine.embeddings), 65536):
+            block = np.asarray(engine.embeddings[start:start + 65536])
+            distances[start:start + len(block)] = ((block - query) ** 2).sum(axis=1)
+        top = np.argsort(distances, kind="stable")[:k]
+        results.append([int(engine.chunk_ids[p]) for p in top])
+    return results
+
+
+def run_benchmark(questions, k: int = RAG_app.top_k, repeat: int = 5):
+    """
+    Measure index build, encoding, retrieval and end-to-end answer performance.
+
+    The index is built from scratch in a temporary directory, caches are
+    disabled so every call does the full work, and answers come from the
+    deterministic local backend, so results reflect only this pipeline.
+    The RAG_app settings changed for the run are restored afterwards.
+
+    Args:
+        questions (List[str]): Question set.
+        k (int): Number of chunks retrieved per question.
+        repeat (int): Timed passes over the question set.
+
+    Returns:
+        dict: "config", "index", "encoding", "retrieve", "recall" and
+        "answer" sections.
+    """
+    work_dir = tempfile.mkdtemp(prefix="rag-benchmark-")
+    overrides = dict(
+        index_dir=work_dir,
+        answer_cache_path=os.path.join(work_dir, "answers.sqlite"),
+        answer_cache_max_entries=0,
+        embedding_cache_size=0,
+        llm_backend="local",
+    )
+    saved = {name: getattr(RAG_app, name) for name in overrides}
+    saved_engine = RAG_app._engine
+    for name, value in overrides.items():
+        setattr(RAG_app, name, value)
+    # Progress messages go to stderr so stdout holds only the JSON report
+    with contextlib.redirect_stdout(sys.stderr):
+        try:
+            start = time.perf_counter()
+            cold = RAG_app.RAGEngine()
+            cold_seconds = time.perf_counter() - start
+            build_seconds = cold.index_seconds
+            cold.llm_client.close()
+
+            # Same settings again, now with the index on disk: model load plus index load
+            start = time.perf_counter()
+            engine = RAG_app.RAGEngine()
+            warm_seconds = time.perf_counter() - start
+            load_seconds = engine.index_seconds
+            RAG_app._engine = engine
+
+            texts = [c["text"] for c in engine.chunks]
+            start = time.perf_counter()
+            engine.embedder.encode(texts, batch_size=RAG_app.batch_size, show_progress_bar=False)
+            encode_seconds = time.perf_counter() - start
+
+            # Warm up once, then time every call
+            RAG_app.retrieve_chunks(questions[0], k)
+            retrieve_times = []
+            for _ in range(repeat):
+                for question in questions:
+                    start = time.perf_counter()
+                    RAG_app.retrieve_chunks(question, k)
+                    retrieve_times.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            RAG_app.retrieve_chunks_batch(questions, k)
+            batch_seconds = time.perf_counter() - start
+
+            found = engine.search_chunk_ids(questions, k)
+            truth = brute_force_ids(engine, questions, k)
+            hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+
+            answer_times = []
+            for _ in range(repeat):
+                for question in questions:
+                    start = time.perf_counter()
+                    RAG_app.answer_question(question)
+                    answer_times.append(time.perf_counter() - start)
+            engine.llm_client.close()
+        finally:
+            RAG_app._engine = saved_engine
+            for name, value in saved.items():
+                setattr(RAG_app, name, value)
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "config": {
+            "corpus_path": RAG_app.corpus_path,
+            "model_name": RAG_app.model_name,
+            "chunk_size": RAG_app.chunk_size,
+            "chunk_overlap": RAG_app.chunk_overlap,
+            "index_type": RAG_app.index_type,
+            "embedding_storage": RAG_app.embedding_storage,
+            "retrieval_mode": RAG_app.retrieval_mode,
+            "k": k,
+            "questions": len(questions),
+            "repeat": repeat,
+            "python": platform.python_version(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "index": {
+            "chunks": len(texts),
+            "cold_start_s": cold_seconds,
+            "warm_start_s": warm_seconds,
+            # Index time alone, without the model load both starts include
+            "build_s": build_seconds,
+            "load_s": load_seconds,
+        },
+        "encoding": {
+            "seconds": encode_seconds,
+            "embeddings_per_sec": len(texts) / encode_seconds if encode_seconds else None,
+        },
+        "retrieve": dict(percentiles(retrieve_times), calls=len(retrieve_times),
+                         batch_questions_per_sec=len(questions) / batch_seconds),
+        "recall": {"recall_at_k": hits / max(1, sum(len(t) for t in truth))},
+        "answer": dict(percentiles(answer_times), calls=len(answer_times), backend="local"),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the RAG pipeline and print JSON.")
+    parser.add_argument("--corpus", default=RAG_app.corpus_path,
+                        help="document or directory of documents to index")
+    parser.add_argument("--questions", help="file with one question per line")
+    parser.add_argument("--k", type=int, default=RAG_app.top_k)
+    parser.add_argument("--repeat", type=int, default=5, help="timed passes over the questions")
+    parser.add_argument("--index-type", default=RAG_app.index_type)
+    parser.add_argument("--storage", default=RAG_app.embedding_storage)
+    parser.add_argument("--retrieval-mode", default=RAG_app.retrieval_mode)
+    parser.add_argument("--output", help="also write the JSON to this file")
+    args = parser.parse_args()
+
+    RAG_app.corpus_path = args.corpus
+    RAG_app.index_type = args.index_type
+    RAG_app.embedding_storage = args.storage
+    RAG_app.retrieval_mode = args.retrieval_mode
+    questions = DEFAULT_QUESTIONS
+    if args.questions:
+        with open(args.questions, "r", encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+
+    result = run_benchmark(questions, k=args.k, repeat=args.repeat)
+    report = json.dumps(result, indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
@@ -0,0 +1,131 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase a question and collapse whitespace so trivial variants share cache entries."""
+    return " ".join(question.lower().split())
+
+
+class EmbeddingCache:
+    """
+    In-memory LRU cache of normalized question -> query embedding.
+
+    Saves a pass through the transformer for questions that were already asked.
+    """
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, question: str):
+        """Return the cached embedding for question, or None."""
+        key = normalize_question(question)
+        with self.lock:
+            vector = self.entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, question: str, vector):
+        """Store the embedding for question, evicting the least recently used entry if full."""
+        key = normalize_question(question)
+        with self.lock:
+            self.entries[key] = vector
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and the current size."""
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.entries)}
+
+
+class AnswerCache:
+    """
+    Persistent SQLite cache of (question, retrieved chunk ids, model, prompt) -> answer.
+
+    Entries expire after ttl seconds, and the least recently used entries are
+    evicted once the cache holds more than max_entries answers.
+    """
+    def __init__(self, path: str, ttl: float = 7 * 24 * 3600, max_entries: int = 10000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            " key TEXT PRIMARY KEY, answer TEXT NOT NULL,"
+            " created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS answers_last_used ON answers (last_used)")
+        self.db.commit()
+
+    @staticmethod
+    def make_key(question: str, chunk_ids, model: str, messages) -> str:
+        """
+        Hash everything that determines the answer into a cache key.
+
+        Args:
+            question (str): The input question string.
+            chunk_ids (List[int]): Ids of the retrieved chunks, in rank order.
+            model (str): Chat model name.
+            messages (List[dict]): The exact prompt sent to the model.
+
+        Returns:
+            str: Hex digest used as the primary key.
+        """
+        payload = json.dumps([normalize_question(question), [int(i) for i in chunk_ids],
+                              model, messages], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        """Return the cached answer for key, or None if it is missing or expired."""
+        now = time.time()
+        with self.lock:
+            row = self.db.execute("SELECT answer, created FROM answers WHERE key = ?",
+                                  (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self.db.execute("DELETE FROM answers WHERE key = ?", (key,))
+                    self.db.commit()
+                self.misses += 1
+                return None
+            self.db.execute("UPDATE answers SET last_used = ? WHERE key = ?", (now, key))
+            self.db.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, answer: str):
+        """Store an answer, then drop expired entries and trim to max_entries."""
+        now = time.time()
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?)",
+                            (key, answer, now, now))
+            self.db.execute("DELETE FROM answers WHERE created < ?", (now - self.ttl,))
+            self.db.execute(
+                "DELETE FROM answers WHERE key IN (SELECT key FROM answers"
+                " ORDER BY last_used DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+            self.db.commit()
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and the current size."""
+        with self.lock:
+            size = self.db.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "size": size}
@@ -1,37 +1,691 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urldefrag, urljoin, urlsplit
+
 import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    from lxml import etree
+except ImportError:  # optional: fall back to BeautifulSoup's html.parser
+    etree = None
+
+# HTML extraction: "lxml" streams the page through a parser that only keeps
+# the article paragraphs, "strainer" parses only the article with BeautifulSoup
+# and "html.parser" is the original full parse. Compare them with
+# `python text_extractor.py --benchmark`.
+PARSERS = ("html.parser", "strainer", "lxml")
+extract_parser = "lxml" if etree is not None else "html.parser"
+stream_chunk_size = 64 * 1024  # bytes read from the response at a time
+
+# Crawler settings
+crawl_dir = "corpus"  # one .txt document per page; point RAG_app.corpus_path here
+crawl_workers = 8  # pages fetched at once
+per_host_delay = 0.5  # minimum seconds between requests to the same host
+request_timeout = 15  # seconds to connect and between bytes received
+max_pages = 500  # stop after this many pages
+state_save_every = 25  # pages between saves of the crawl state
+user_agent = "AIE-RAG-crawler/1.0 (educational project)"
+STATE_FILE = "crawl_state.json"  # ETag/Last-Modified and links of every crawled page
+
+
+class ContentTarget:
+    """
+    lxml parser target that keeps only the paragraphs and links of div.mw-parser-output.
+
+    Receives parse events instead of building a document tree, so memory
+    stays small however large the page is, and the page can be fed in
+    pieces as it downloads. Text matches BeautifulSoup's get_text(strip=True)
+    on each paragraph.
+    """
+    def __init__(self):
+        self.depth = 0  # elements open inside the content div, 0 when outside it
+        self.found = False
+        self.paragraph_depth = 0
+        self.pending = []  # pieces of the current text node
+        self.current = []
+        self.paragraphs = []
+        self.hrefs = []
+
+    def flush(self):
+        if self.pending:
+            text = "".join(self.pending).strip()
+            if text:
+                self.current.append(text)
+            self.pending = []
+
+    def start(self, tag, attrib):
+        if self.found and not self.depth:
+            return
+        self.flush()
+        if self.depth:
+            self.depth += 1
+            if tag == "p":
+                self.paragraph_depth += 1
+            elif tag == "a" and "href" in attrib:
+                self.hrefs.append(attrib["href"])
+        elif tag == "div" and "mw-parser-output" in attrib.get("class", "").split():
+            self.depth = 1
+            self.found = True
+
+    def end(self, tag):
+        if not self.depth:
+            return
+        self.flush()
+        if tag == "p" and self.paragraph_depth:
+            self.paragraph_depth -= 1
+            if not self.paragraph_depth:
+                if self.current:
+                    self.paragraphs.append("".join(self.current))
+                self.current = []
+        self.depth -= 1
+
+    def data(self, text):
+        if self.paragraph_depth:
+            self.pending.append(text)
+
+    def close(self):
+        return self
+
+
+def extract_stream(pieces, parser: str = None, encoding: str = "utf-8"):
+    """
+    Extract the article paragraphs and links from a page arriving in pieces.
+
+    With the "lxml" parser each piece is parsed as soon as it arrives and
+    discarded; the BeautifulSoup parsers need the whole page first.
+
+    Args:
+        pieces (Iterable[bytes]): The page's HTML, e.g. response.iter_content().
+        parser (str | None): One of PARSERS; defaults to extract_parser.
+        encoding (str): Character encoding of the page.
+
+    Returns:
+        Tuple[str | None, List[str]]: The paragraphs joined by blank lines
+        (None when the page has no div.mw-parser-output) and the raw href of
+        every link inside that div.
+    """
+    parser = parser or extract_parser
+    if parser == "lxml":
+        target = ContentTarget()
+        html_parser = etree.HTMLParser(target=target, encoding=encoding)
+        for piece in pieces:
+            html_parser.feed(piece)
+        html_parser.close()
+        if not target.found:
+            return None, []
+        return "\n\n".join(target.paragraphs), target.hrefs
+    return extract_text(b"".join(pieces).decode(encoding, errors="replace"), parser)
+
+
+def extract_text(html, parser: str = None):
+    """
+    Extract the article paragraphs and links from a Wikipedia-style page.
+
+    Args:
+        html (str): The page's HTML.
+        parser (str | None): One of PARSERS; defaults to extract_parser.
+            "html.parser" builds the full tree with Python's parser,
+            "strainer" uses a SoupStrainer so only the content div is built
+            (with lxml's tokenizer when available) and "lxml" streams parse
+            events through ContentTarget.
+
+    Returns:
+        Tuple[str | None, List[str]]: See extract_stream().
+    """
+    parser = parser or extract_parser
+    if parser not in PARSERS:
+        raise ValueError(f"Unknown parser '{parser}'. Choose from: {', '.join(PARSERS)}")
+    if parser == "lxml":
+        return extract_stream([html.encode("utf-8")], parser)
+    if parser == "strainer":
+        strainer = SoupStrainer('div', class_='mw-parser-output')
+        soup = BeautifulSoup(html, 'lxml' if etree is not None else 'html.parser',
+                             parse_only=strainer)
+    else:
+        soup = BeautifulSoup(html, 'html.parser')
+    content_div = soup.find('div', class_='mw-parser-output')
+    if not content_div:
+        return None, []
+    paragraphs = content_div.find_all('p')
+    text = '\n\n'.join(p.get_text(strip=True) for p in paragraphs if p.get_text(strip=True))
+    return text, [a['href'] for a in content_div.find_all('a', href=True)]
+
 
 def fetch_and_extract(url):
     try:
-        response = requests.get(url)
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.text, 'html.parser')
-            content_div = soup.find('div', class_='mw-parser-output')
-            if not content_div:
-                print("The expected content container was not found.")
+        with requests.get(url, timeout=request_timeout, stream=True) as response:
+            if response.status_code != 200:
+                print(f"Failed to retrieve the page. HTTP Status Code: {response.status_code}")
                 return ""
-            
-            paragraphs = content_div.find_all('p')
-            extracted_text = '\n\n'.join(p.get_text(strip=True) for p in paragraphs if p.get_text(strip=True))
+            extracted_text, _ = extract_stream(response.iter_content(stream_chunk_size),
+                                               encoding=response.encoding or "utf-8")
+        if extracted_text is None:
+            print("The expected content container was not found.")
+            return ""
 
-            with open('Selected_Document.txt', 'w', encoding='utf-8') as file:
-                file.write(extracted_text)
+        with open('Selected_Document.txt', 'w', encoding='utf-8') as file:
+            file.write(extracted_text)
 
-            print("Page successfully retrieved and content saved to 'Selected_Document.txt'.")
-            return extracted_text
-        else:
-            print(f"Failed to retrieve the page. HTTP Status Code: {response.status_code}")
-            return ""
+        print("Page successfully retrieved and content saved to 'Selected_Document.txt'.")
+        return extracted_text
     except requests.RequestException as e:
         print(f"An error occurred while fetching the URL: {e}")
         return ""
 
+
+# --------- Crawler ---------
+def make_session(pool_size: int = crawl_workers, retries: int = 2):
+    """
+    Create a requests session whose connections are pooled and reused across pages.
+
+    Connection errors and 429/5xx responses are retried with backoff,
+    honouring Retry-After.
+    """
+    session = requests.Session()
+    retry = Retry(total=retries, backoff_factor=0.5,
+                  status_forcelist=(429, 500, 502, 503, 504), respect_retry_after_header=True)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["User-Agent"] = user_agent
+    return session
+
+
+class HostRateLimiter:
+    """
+    Spaces out requests to each host by at least min_interval seconds.
+
+    Callers reserve the next free slot for the host under a lock and then
+    sleep outside it, so waiting on one host never blocks another.
+    """
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self.next_slot = defaultdict(float)
+        self.lock = threading.Lock()
+
+    def wait(self, url: str):
+        """Block until a request to url's host is allowed."""
+        host = urlsplit(url).netloc
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot[host])
+            self.next_slot[host] = slot + self.min_interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def page_filename(url: str) -> str:
+    """Return a stable, filesystem-safe document name for a page URL."""
+    path = urlsplit(url).path.rstrip("/")
+    slug = re.sub(r"[^A-Za-z0-9_-]+", "_", path.rsplit("/", 1)[-1])[:80] or "index"
+    return f"{slug}-{hashlib.sha1(url.encode('utf-8')).hexdigest()[:8]}.txt"
+
+
+def page_links(hrefs, base_url: str):
+    """Resolve a page's hrefs and keep the http(s) links on the same host, without fragments."""
+    host = urlsplit(base_url).netloc
+    links = []
+    for href in hrefs:
+        link = urldefrag(urljoin(base_url, href))[0]
+        parts = urlsplit(link)
+        # Skip other sites and Wikipedia's File:, Help:, Special: ... namespaces
+        if parts.scheme in ("http", "https") and parts.netloc == host \
+                and ":" not in parts.path.rsplit("/", 1)[-1]:
+            links.append(link)
+    return list(dict.fromkeys(links))
+
+
+def crawl_page(session, limiter, url: str, previous, out_dir: str, timeout: float):
+    """
+    Fetch one page, conditionally if it was crawled before, and save its text.
+
+    Args:
+        session (requests.Session): Pooled session from make_session().
+        limiter (HostRateLimiter): Shared per-host rate limiter.
+        url (str): Page to fetch.
+        previous (dict | None): The page's entry from the last crawl.
+        out_dir (str): Directory receiving one document per page.
+        timeout (float): Request timeout in seconds.
+
+    Returns:
+        dict: The page's new state entry ("etag", "last_modified", "file",
+        "links") plus "status": "fetched", "not_modified", "no_content",
+        "failed" or "gone" (404 or 410; its document is deleted and the
+        entry is empty).
+    """
+    headers = {}
+    if previous:
+        if previous.get("etag"):
+            headers["If-None-Match"] = previous["etag"]
+        if previous.get("last_modified"):
+            headers["If-Modified-Since"] = previous["last_modified"]
+    limiter.wait(url)
+    try:
+        # Stream the body into the parser instead of buffering the whole page
+        with session.get(url, headers=headers, timeout=timeout, stream=True) as response:
+            if response.status_code == 304 and previous:
+                return dict(previous, status="not_modified")
+            if response.status_code in (404, 410):
+                if previous and previous.get("file"):
+                    try:
+                        os.remove(os.path.join(out_dir, previous["file"]))
+                    except FileNotFoundError:
+                        pass
+                return {"status": "gone"}
+            if response.status_code != 200:
+                print(f"Failed to retrieve {url}. HTTP Status Code: {response.status_code}")
+                return dict(previous or {}, status="failed")
+            text, hrefs = extract_stream(response.iter_content(stream_chunk_size),
+                                         encoding=response.encoding or "utf-8")
+    except requests.RequestException as e:
+        print(f"An error occurred while fetching {url}: {e}")
+        return dict(previous or {}, status="failed")
+
+    entry = {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "file": None,
+        "links": [],
+    }
+    if not text:
+        return dict(entry, status="no_content")
+    entry["file"] = page_filename(url)
+    entry["links"] = page_links(hrefs, url)
+    with open(os.path.join(out_dir, entry["file"]), 'w', encoding='utf-8') as file:
+        file.write(text)
+    return dict(entry, status="fetched")
+
+
+def crawl(urls, out_dir: str = crawl_dir, depth: int = 0, workers: int = crawl_workers,
+          delay: float = per_host_delay, timeout: float = request_timeout,
+          page_limit: int = max_pages, session=None):
+    """
+    Crawl pages breadth-first and save each one as its own document in out_dir.
+
+    Pages are fetched concurrently over one pooled session, requests to the
+    same host are spaced by delay seconds, and pages crawled before are only
+    downloaded again if their ETag or Last-Modified says they changed. The
+    per-page state is kept in out_dir/crawl_state.json, saved every
+    state_save_every pages and when the crawl ends or is interrupted. Pages
+    that now answer 404 or 410 are dropped from the state and their
+    documents deleted.
+
+    Args:
+        urls (List[str]): Pages to start from.
+        out_dir (str): Directory receiving one .txt document per page.
+        depth (int): How many levels of links to follow from urls (0: urls only).
+        workers (int): Pages fetched at once.
+        delay (float): Minimum seconds between requests to the same host.
+        timeout (float): Request timeout in seconds.
+        page_limit (int): Maximum number of pages to crawl.
+        session (requests.Session | None): Session to use; one is made if None.
+
+    Returns:
+        dict: Number of pages per status, plus "pages" and "seconds".
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    state_path = os.path.join(out_dir, STATE_FILE)
+    state = {}
+    if os.path.exists(state_path):
+        with open(state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+
+    session = session or make_session(workers)
+    limiter = HostRateLimiter(delay)
+    counts = defaultdict(int)
+    start = time.perf_counter()
+    seen = set()
+    level = list(dict.fromkeys(urldefrag(u)[0] for u in urls))
+    def save_state():
+        with open(state_path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=2)
+        os.replace(state_path + ".tmp", state_path)
+
+    done = 0
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for current_depth in range(depth + 1):
+                level = [u for u in level if u not in seen][:page_limit - len(seen)]
+                if not level:
+                    break
+                seen.update(level)
+                results = pool.map(
+                    lambda u: crawl_page(session, limiter, u, state.get(u), out_dir, timeout),
+                    level)
+                next_level = []
+                for url, entry in zip(level, results):
+                    status = entry.pop("status")
+                    counts[status] += 1
+                    if status == "gone":
+                        state.pop(url, None)
+                    elif entry:
+                        state[url] = entry
+                    next_level.extend(entry.get("links", []))
+                    done += 1
+                    if done % state_save_every == 0:
+                        save_state()
+                level = next_level
+    finally:
+        # Keep the ETags of the pages that finished, even when interrupted
+        save_state()
+    return dict(counts, pages=len(seen), seconds=time.perf_counter() - start)
+
+
+# --------- Local stand-in site ---------
+class StandInSiteHandler(BaseHTTPRequestHandler):
+    """
+    Serves a small linked set of Wikipedia-style pages at /wiki/Page_<n>.
+
+    Responses carry an ETag and Last-Modified and answer conditional requests
+    with 304; pages listed in gone answer 410. The time of every request is
+    recorded in request_log.
+    """
+    pages = 10
+    links_per_page = 3
+    request_log = None
+    gone = ()
+    last_modified = "Mon, 01 Jan 2024 00:00:00 GMT"
+
+    def do_GET(self):
+        self.request_log.append((time.monotonic(), self.path))
+        match = re.fullmatch(r"/wiki/Page_(\d+)", self.path)
+        if not match or int(match.group(1)) >= self.pages:
+            self.send_error(404)
+            return
+        if self.path in self.gone:
+            self.send_error(410)
+            return
+        n = int(match.group(1))
+        links = "".join(f'<a href="/wiki/Page_{(n * self.links_per_page + i) % self.pages}">'
+                        f'link</a> ' for i in range(1, self.links_per_page + 1))
+        body = (f'<html><body><div class="mw-parser-output">'
+                f'<p>Page {n} is about seahorse number {n}.</p>'
+                f'<p>See also {links}<a href="/wiki/File:Seahorse.jpg">a file</a></p>'
+                f'</div></body></html>').encode("utf-8")
+        etag = f'"{hashlib.sha1(body).hexdigest()[:16]}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", self.last_modified)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_stand_in_site(host: str = "127.0.0.1", port: int = 0, pages: int = 10):
+    """
+    Start the stand-in site in a background thread.
+
+    Returns:
+        ThreadingHTTPServer: The running server; its request times are in
+        server.RequestHandlerClass.request_log. Call shutdown() to stop it.
+    """
+    handler = type("Handler", (StandInSiteHandler,), {"pages": pages, "request_log": []})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# --------- Extraction benchmark ---------
+def write_fixtures(directory: str, count: int = 5, paragraphs: int = 250, seed: int = 0):
+    """
+    Write synthetic Wikipedia-style pages for benchmarking extraction.
+
+    Each page has the bulk of a real article around the content: navigation,
+    infobox and reference tables, inline markup, entities and a footer. Saved
+    real pages (e.g. `curl -o page.html <url>`) can be benchmarked instead.
+
+    Returns:
+        List[str]: Paths of the written .html files.
+    """
+    rng = random.Random(seed)
+    words = ("seahorse", "pouch", "male", "brood", "species", "reef", "tail", "snout",
+             "courtship", "eggs", "Hippocampus", "fins", "coral", "plankton", "camouflage")
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for n in range(count):
+        nav = "".join(f'<li><a href="/wiki/Portal:{i}">Portal {i}</a></li>' for i in range(400))
+        body = []
+        for i in range(paragraphs):
+            sentence = " ".join(rng.choice(words) for _ in range(rng.randint(40, 120)))
+            body.append(f'<p>{sentence[:60]} <a href="/wiki/Topic_{i}">topic {i}</a> '
+                        f'<b>{sentence[60:90]}</b> &amp; {sentence[90:]}'
+                        f'<sup class="reference"><a href="#cite-{i}">[{i}]</a></sup></p>')
+            if i % 10 == 0:
+                body.append('<table class="wikitable">' + "".join(
+                    f"<tr><td>{rng.choice(words)}</td><td>{j}</td></tr>" for j in range(30))
+                    + "</table><p>\n</p>")
+        refs = "".join(f'<li id="cite-{i}">Reference {i}, <i>Journal</i> ({1900 + i}).</li>'
+                       for i in range(paragraphs))
+        html = (f'<!DOCTYPE html><html><head><title>Fixture {n}</title>'
+                f'<script>{"var x = 1;" * 5000}</script></head><body>'
+                f'<nav><ul>{nav}</ul></nav><div id="content"><div class="mw-parser-output">'
+                f'{"".join(body)}<ol class="references">{refs}</ol></div></div>'
+                f'<footer>{"<p>Footer text.</p>" * 50}</footer></body></html>')
+        path = os.path.join(directory, f"fixture-{n}.html")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(html)
+        paths.append(path)
+    return paths
+
+
+def _benchmark_parser(parser: str, paths, repeat: int):
+    # Runs in a fresh process so peak memory is measured for this parser alone
+    import resource
+    import tracemalloc
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+    digest = hashlib.sha1()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for path in paths:
+            with open(path, "rb") as f:
+                # Read in response-sized pieces, as crawl_page() streams a download
+                pieces = iter(lambda: f.read(stream_chunk_size), b"")
+                text, hrefs = extract_stream(pieces, parser)
+            digest.update((text or "").encode("utf-8"))
+    seconds = time.perf_counter() - start
+    _, python_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_growth = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before
+    if sys.platform != "darwin":
+        rss_growth *= 1024  # ru_maxrss is in kilobytes on Linux
+    return dict(parser=parser, pages_per_sec=repeat * len(paths) / seconds,
+                python_peak_mb=python_peak / 2 ** 20, rss_growth_mb=rss_growth / 2 ** 20,
+                digest=digest.hexdigest())
+
+
+def benchmark_extraction(paths, parsers=PARSERS, repeat: int = 2):
+    """
+    Compare extraction speed and peak memory of each parser on saved HTML pages.
+
+    Each parser runs in its own fresh process. Peak memory is reported as
+    Python allocations (tracemalloc) and as growth of the process's maximum
+    resident set size, which also covers lxml's C allocations.
+
+    Args:
+        paths (List[str]): Saved .html pages.
+        parsers (Iterable[str]): Parsers to compare, from PARSERS.
+        repeat (int): Passes over the pages per parser.
+
+    Returns:
+        List[dict]: One row per parser with "parser", "pages_per_sec",
+        "python_peak_mb", "rss_growth_mb" and "same_text" (whether its text
+        matches the first parser's).
+    """
+    rows = []
+    for parser in parsers:
+        if parser == "lxml" and etree is None:
+            continue
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            rows.append(pool.submit(_benchmark_parser, parser, paths, repeat).result())
+    reference = rows[0]["digest"] if rows else None
+    for row in rows:
+        row["same_text"] = row.pop("digest") == reference
+    return rows
+
+
+def print_extraction_benchmark(rows):
+    """Print benchmark_extraction() rows as a table, followed by the raw JSON."""
+    print(f"{'parser':<12} {'pages/s':>9} {'python MB':>10} {'RSS MB':>8} {'same text':>10}")
+    for row in rows:
+        print(f"{row['parser']:<12} {row['pages_per_sec']:>9.1f} {row['python_peak_mb']:>10.1f} "
+              f"{row['rss_growth_mb']:>8.1f} {str(row['same_text']):>10}")
+    print(json.dumps(rows))
+
+
+# Function to check the crawler against the stand-in site
+def run_self_test() -> bool:
+    """
+    Crawl the stand-in site twice and check the results.
+
+    Checks that following links reaches every page, that one document is
+    written per page, that requests to the host are spaced by the delay on average, and
+    that the second crawl is answered entirely with 304 Not Modified. Then
+    checks that a page that has gone is removed, and that an interrupted
+    crawl still saves the state of the pages it finished.
+
+    Returns:
+        bool: True if every check passed.
+    """
+    pages, delay = 12, 0.05
+    server = serve_stand_in_site(pages=pages)
+    log = server.RequestHandlerClass.request_log
+    seed = f"http://127.0.0.1:{server.server_address[1]}/wiki/Page_0"
+    checks = []
+    try:
+        with tempfile.TemporaryDirectory() as out_dir:
+            first = crawl([seed], out_dir, depth=3, workers=4, delay=delay)
+            documents = [f for f in os.listdir(out_dir) if f.endswith(".txt")]
+            checks.append((first.get("fetched") == pages and len(documents) == pages,
+                           f"first crawl fetched {first.get('fetched', 0)} pages and wrote "
+                           f"{len(documents)} documents (expected {pages})"))
+            # Arrival times jitter by a few milliseconds, so check the average spacing
+            times = sorted(t for t, _ in log)
+            gap = (times[-1] - times[0]) / (len(times) - 1)
+            checks.append((gap >= delay * 0.95,
+                           f"average gap between requests {gap:.3f}s (delay {delay}s)"))
+            second = crawl([seed], out_dir, depth=3, workers=4, delay=delay)
+            checks.append((second.get("not_modified") == pages and not second.get("fetched"),
+                           f"second crawl: {second.get('not_modified', 0)} not modified, "
+                           f"{second.get('fetched', 0)} fetched again"))
+
+            gone_url = seed.replace("Page_0", "Page_3")
+            with open(os.path.join(out_dir, STATE_FILE), 'r', encoding='utf-8') as f:
+                gone_file = json.load(f)[gone_url]["file"]
+            server.RequestHandlerClass.gone = ("/wiki/Page_3",)
+            third = crawl([seed], out_dir, depth=3, workers=4, delay=0)
+            with open(os.path.join(out_dir, STATE_FILE), 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            checks.append((third.get("gone") == 1 and gone_url not in state
+                           and not os.path.exists(os.path.join(out_dir, gone_file)),
+                           "a page answering 410 is dropped with its document"))
+            server.RequestHandlerClass.gone = ()
+
+        with tempfile.TemporaryDirectory() as out_dir:
+            session = make_session(4)
+            get, calls = session.get, []
+
+            def interrupting_get(url, **kwargs):
+                calls.append(url)
+                if len(calls) > 5:
+                    raise KeyboardInterrupt
+                return get(url, **kwargs)
+
+            session.get = interrupting_get
+            try:
+                crawl([seed], out_dir, depth=3, workers=1, delay=0, session=session)
+            except KeyboardInterrupt:
+                pass
+            try:
+                with open(os.path.join(out_dir, STATE_FILE), 'r', encoding='utf-8') as f:
+                    saved = len(json.load(f))
+            except OSError:
+                saved = 0
+            checks.append((saved == 5, f"interrupted crawl saved the state of {saved} "
+                                       f"finished pages (expected 5)"))
+    finally:
+        server.shutdown()
+
+    for passed, message in checks:
+        print(f"{'PASS' if passed else 'FAIL'}: {message}")
+    return all(passed for passed, _ in checks)
+
+
 def main():
+    global extract_parser
+    parser = argparse.ArgumentParser(
+        description="Save a Wikipedia article's text, or crawl many pages into a corpus.")
+    parser.add_argument("--urls", help="file with one URL per line to crawl")
+    parser.add_argument("--seed", action="append", default=[],
+                        help="URL to start crawling from (repeatable)")
+    parser.add_argument("--depth", type=int, default=0, help="levels of links to follow")
+    parser.add_argument("--out-dir", default=crawl_dir, help="directory for the documents")
+    parser.add_argument("--workers", type=int, default=crawl_workers)
+    parser.add_argument("--delay", type=float, default=per_host_delay,
+                        help="minimum seconds between requests to the same host")
+    parser.add_argument("--max-pages", type=int, default=max_pages)
+    parser.add_argument("--parser", choices=PARSERS, default=extract_parser,
+                        help="HTML extraction method")
+    parser.add_argument("--benchmark", nargs="?", const="", metavar="DIR",
+                        help="compare the parsers on the .html pages in DIR "
+                             "(synthetic pages if DIR is omitted) and exit")
+    parser.add_argument("--test", action="store_true",
+                        help="crawl a local stand-in site to check the crawler and exit")
+    args = parser.parse_args()
+    extract_parser = args.parser
+
+    if args.test:
+        sys.exit(0 if run_self_test() else 1)
+
+    if args.benchmark is not None:
+        if args.benchmark:
+            paths = sorted(glob.glob(os.path.join(args.benchmark, "*.html")))
+            print_extraction_benchmark(benchmark_extraction(paths))
+        else:
+            with tempfile.TemporaryDirectory() as fixture_dir:
+                print_extraction_benchmark(benchmark_extraction(write_fixtures(fixture_dir)))
+        return
+
+    urls = list(args.seed)
+    if args.urls:
+        with open(args.urls, 'r', encoding='utf-8') as f:
+            urls.extend(line.strip() for line in f if line.strip() and not line.startswith("#"))
+    if urls:
+        stats = crawl(urls, args.out_dir, depth=args.depth, workers=args.workers,
+                      delay=args.delay, page_limit=args.max_pages)
+        print(f"Crawled {stats['pages']} pages into '{args.out_dir}' in {stats['seconds']:.1f}s: "
+              f"{stats.get('fetched', 0)} fetched, {stats.get('not_modified', 0)} not modified, "
+              f"{stats.get('no_content', 0)} without content, {stats.get('failed', 0)} failed.")
+        return
+
     # Hardcoded URL here:
-    url = "https://en.wikipedia.org/wiki/Seahorse"  
+    url = "https://en.wikipedia.org/wiki/Seahorse"
     fetch_and_extract(url)
 
 if __name__ == '__main__':
     main()
-
-